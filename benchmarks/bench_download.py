@@ -0,0 +1,102 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Throughput and CPU time per GB served by each download backend.
+
+The response is consumed like a WSGI server would, into /dev/null: files with
+os.sendfile (wsgi.file_wrapper), other responses chunk by chunk. "offload" only
+measures the worker side, the Web server sends the file.
+"""
+
+from pathlib import Path
+import os
+import time
+import types
+
+import pygit2
+
+from django.test import RequestFactory, override_settings
+
+from benchmarks import utils
+
+from tests.project import views
+
+BACKENDS = ["memory", "stream", "file", "offload"]
+
+
+def consume(response, out):
+    """Send the response body to the output file, return the number of bytes."""
+    if getattr(response, "file_to_stream", None) is not None:
+        f = response.file_to_stream
+        size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset < size:
+            offset += os.sendfile(out, f.fileno(), offset, size - offset)
+        response.close()
+        return size
+    sent = 0
+    for chunk in response:
+        sent += os.write(out, chunk)
+    response.close()
+    return sent
+
+
+def main():
+    parser = utils.argument_parser(__doc__, files=1)
+    parser.add_argument("--size", type=int, default=256, help="blob size in MiB")
+    args = parser.parse_args()
+
+    superuser = types.SimpleNamespace(is_superuser=True, is_authenticated=True)
+    request = RequestFactory().get("/")
+    request.user = superuser
+
+    with utils.temporary_directory() as tempdir:
+        location = Path(tempdir) / "synthetic"
+        repo = pygit2.init_repository(str(location), bare=True)
+        builder = repo.TreeBuilder()
+        blob_id = repo.create_blob(os.urandom(args.size * 1024 * 1024))
+        builder.insert("large.bin", blob_id, pygit2.GIT_FILEMODE_BLOB)
+        signature = pygit2.Signature("Git Storage", "git@storage")
+        repo.create_commit("HEAD", signature, signature, "Large", builder.write(), [])
+        utils.use_repository(location)
+
+        print(f"{args.size} MiB blob, best of {args.repeat}")
+        with open(os.devnull, "wb") as devnull, override_settings(
+            GITSTORAGE_SPOOL_ROOT=os.path.join(tempdir, "spool")
+        ):
+            for backend in BACKENDS:
+                view = views.TestDownloadView.as_view(download_backend=backend)
+                # Fill the spool first
+                consume(view(request, path="large.bin"), devnull.fileno())
+
+                best_wall = best_cpu = None
+                for _ in range(args.repeat):
+                    wall, cpu = time.perf_counter(), time.process_time()
+                    consume(view(request, path="large.bin"), devnull.fileno())
+                    wall = time.perf_counter() - wall
+                    cpu = time.process_time() - cpu
+                    best_wall = wall if best_wall is None else min(best_wall, wall)
+                    best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+
+                gigabytes = args.size / 1024
+                print(
+                    f"{backend:>8}: {args.size / best_wall:10.1f} MiB/s"
+                    f" {best_cpu / gigabytes:8.3f} CPU s/GiB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Time and memory to list a tree of 10k blobs, before and after models.ListingEntry.
+
+Before, each entry was a dictionary and a Blob model instance.
+"""
+
+import operator
+from pathlib import Path
+import tracemalloc
+
+from benchmarks import utils
+
+from gitstorage import models
+from gitstorage import repository
+
+
+def dict_entries(path, entries):
+    listed = [
+        {
+            "name": entry.name,
+            "path": str(path / entry.name),
+            "blob": models.Blob(pk=entry.hex, name=entry.name),
+        }
+        for entry in entries
+    ]
+    return sorted(listed, key=operator.itemgetter("name"))
+
+
+def slots_entries(path, entries):
+    listed = [
+        models.ListingEntry(entry.name, path, entry.hex, entry.type)
+        for entry in entries
+    ]
+    listed.sort(key=operator.attrgetter("name"))
+    return listed
+
+
+def allocated(func, *args):
+    """Memory still allocated by the result, and number of memory blocks."""
+    tracemalloc.start()
+    try:
+        result = func(*args)  # noqa: F841 keep it alive
+        snapshot = tracemalloc.take_snapshot()
+        size, _peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    return size, blocks
+
+
+def main():
+    parser = utils.argument_parser(__doc__, files=10000)
+    args = parser.parse_args()
+
+    with utils.temporary_directory() as tempdir:
+        location = Path(tempdir) / "synthetic"
+        utils.build_synthetic_repository(location, args.files, args.files, depth=1)
+        utils.use_repository(location)
+
+        path = Path("d00000")
+        _trees, blobs = repository.Repository().listdir(path)
+        per_10k = 10000 / len(blobs)
+        print(f"{len(blobs)} blobs, per 10k entries")
+        for label, func in [("before (dict)", dict_entries), ("after", slots_entries)]:
+            elapsed = utils.timeit(lambda: func(path, blobs), args.repeat) * per_10k
+            size, blocks = allocated(func, path, blobs)
+            print(
+                f"{label:>14}: {elapsed:8.2f} ms {size * per_10k / 1024:10.0f} KiB"
+                f" {blocks * per_10k:10.0f} blocks"
+            )
+
+
+if __name__ == "__main__":
+    main()
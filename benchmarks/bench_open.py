@@ -0,0 +1,54 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Open-to-first-byte: open the repository and read the first byte of the deepest blob.
+
+Compare the former behaviour, loading the head tree in the index on every opening,
+to the lazy index only loaded on first use.
+"""
+
+from pathlib import Path
+
+from benchmarks import utils
+
+from gitstorage import repository
+
+
+def first_byte(path, eager_index):
+    repo = repository.Repository()
+    if eager_index:
+        # Loaded from the head tree on first access
+        repo.index
+    return repo.open(path).data[:1]
+
+
+def main():
+    parser = utils.argument_parser(__doc__)
+    args = parser.parse_args()
+
+    with utils.temporary_directory() as tempdir:
+        location = Path(tempdir) / "synthetic"
+        path = utils.build_synthetic_repository(location, args.files, args.per_dir)
+        utils.use_repository(location)
+
+        print(f"{args.files} files, opening then reading {path}")
+        for label, eager_index in [("before (eager index)", True), ("after", False)]:
+            elapsed = utils.timeit(lambda: first_byte(path, eager_index), args.repeat)
+            print(f"{label:>22}: {elapsed:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Time to list a page of a tree of 50k blobs, against listing every entry, by name and
+by another key (selected with a heap), on the first and a deep page.
+"""
+
+import operator
+from pathlib import Path
+
+from benchmarks import utils
+
+from django.contrib.auth.models import AnonymousUser
+from django.test.client import RequestFactory
+
+from gitstorage import permissions
+from gitstorage import repository
+from gitstorage import views
+
+
+class TreeView(views.TreeViewMixin):
+    pass
+
+
+def make_view(snapshot, path, paginate_by, sort_key, after=None):
+    request = RequestFactory().get("/", {"blobs_after": after} if after else {})
+    request.user = AnonymousUser()
+    view = TreeView()
+    view.request = request
+    view.repo = snapshot
+    view.path = path
+    view.paginate_by = paginate_by
+    view.sort_key = sort_key
+    # Everything is allowed, don't measure the permission query
+    view.permissions = permissions.PermissionIndex(None)
+    return view
+
+
+def main():
+    parser = utils.argument_parser(__doc__, files=50000)
+    parser.add_argument("--page", type=int, default=50, help="entries by page")
+    args = parser.parse_args()
+
+    with utils.temporary_directory() as tempdir:
+        location = Path(tempdir) / "synthetic"
+        utils.build_synthetic_repository(location, args.files, args.files, depth=1)
+        utils.use_repository(location)
+
+        snapshot = repository.Repository().snapshot()
+        path = Path("d00000")
+        _trees, blobs = snapshot.listdir(path)
+        deep = blobs[len(blobs) * 9 // 10].name
+        # Sizes are cached across requests, measure warm
+        snapshot.read_sizes([blob.hex for blob in blobs])
+
+        print(f"{len(blobs)} blobs, pages of {args.page}")
+        for label, sort_key in [
+            ("name", views.SORT_BY_NAME),
+            ("hex", operator.attrgetter("hex")),
+        ]:
+            for paginate_by, after in [
+                (None, None),
+                (args.page, None),
+                (args.page, deep),
+            ]:
+                page = "all" if paginate_by is None else ("deep" if after else "first")
+                elapsed = utils.timeit(
+                    lambda: make_view(
+                        snapshot, path, paginate_by, sort_key, after
+                    ).filter_blobs(),
+                    args.repeat,
+                )
+                print(f"{label:>5} {page:>6}: {elapsed:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Time to read the sizes of the blobs of a listing, inflating each blob or only reading
+its object header, with loose and packed objects.
+"""
+
+import os
+from pathlib import Path
+import shutil
+
+from benchmarks import utils
+
+from gitstorage import odb
+from gitstorage import repository
+
+
+def inflated_sizes(repo, hexes):
+    return {hex: repo[hex].size for hex in hexes}
+
+
+def header_sizes(repo, hexes):
+    with odb.ObjectDatabase(repo) as database:
+        return {hex: database.read_header(hex)[1] for hex in hexes}
+
+
+def pack(repo):
+    objects = os.path.join(repo.path, "objects")
+    os.makedirs(os.path.join(objects, "pack"), exist_ok=True)
+    repo.pack()
+    for name in os.listdir(objects):
+        if len(name) == 2:
+            shutil.rmtree(os.path.join(objects, name))
+
+
+def main():
+    parser = utils.argument_parser(__doc__, files=1000)
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="blob size")
+    args = parser.parse_args()
+
+    with utils.temporary_directory() as tempdir:
+        location = Path(tempdir) / "synthetic"
+        utils.build_synthetic_repository(
+            location, args.files, args.files, depth=1, size=args.size
+        )
+        utils.use_repository(location)
+
+        print(f"{args.files} blobs of {args.size} bytes")
+        for storage in ("loose", "packed"):
+            if storage == "packed":
+                pack(repository.Repository())
+            _trees, blobs = repository.Repository().listdir("d00000")
+            hexes = [entry.hex for entry in blobs]
+            for label, func in [("inflated", inflated_sizes), ("header", header_sizes)]:
+                # A fresh repository each time, libgit2 caches objects
+                elapsed = utils.timeit(
+                    lambda: func(repository.Repository(), hexes), args.repeat
+                )
+                print(f"{storage:8} {label:10} {elapsed:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
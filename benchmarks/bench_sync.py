@@ -0,0 +1,93 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Time to diff a push of 10 modified blobs into a large repository, against walking the
+whole tree as a full resynchronization would.
+"""
+
+from pathlib import Path, PurePath
+
+import pygit2
+
+from benchmarks import utils
+
+from gitstorage import repository
+from gitstorage import sync
+
+
+def replace_blob(repo, tree, segments, data):
+    """Write a copy of the tree with the blob at the given path replaced."""
+    builder = repo.TreeBuilder(tree)
+    name = segments[0]
+    if len(segments) == 1:
+        builder.insert(name, repo.create_blob(data), pygit2.GIT_FILEMODE_BLOB)
+    else:
+        subtree = replace_blob(repo, repo[tree[name].id], segments[1:], data)
+        builder.insert(name, subtree, pygit2.GIT_FILEMODE_TREE)
+    return builder.write()
+
+
+def push(repo, paths):
+    """Commit the given blobs modified on top of HEAD."""
+    tree = repo.head.peel(pygit2.Tree)
+    tree_id = tree.id
+    for path in paths:
+        tree_id = replace_blob(repo, repo[tree_id], path.split("/"), b"pushed\n")
+    signature = pygit2.Signature("Git Storage", "git@storage")
+    return repo.create_commit(
+        "HEAD", signature, signature, "Push", tree_id, [repo.head.target]
+    )
+
+
+def main():
+    parser = utils.argument_parser(__doc__, files=1000000)
+    parser.add_argument("--changes", type=int, default=10, help="blobs pushed")
+    args = parser.parse_args()
+
+    with utils.temporary_directory() as tempdir:
+        location = Path(tempdir) / "synthetic"
+        utils.build_synthetic_repository(location, args.files, args.per_dir)
+        utils.use_repository(location)
+
+        repo = repository.Repository()
+        old = repo.head.target
+        # Spread over as many trees as possible
+        step = args.files // args.changes
+        paths = [
+            "d{:05d}/d{:05d}/f{:09d}.txt".format(
+                i // args.per_dir**2 % args.per_dir, i // args.per_dir % args.per_dir, i
+            )
+            for i in range(0, step * args.changes, step)
+        ]
+        new = push(repo, paths)
+        changes = sync.diff_commits(repo, old.hex, new.hex)
+        blobs = [change for change in changes if change.type == pygit2.GIT_OBJ_BLOB]
+        assert len(blobs) == args.changes, changes
+
+        print(f"{args.files} blobs, {args.changes} modified")
+        elapsed = utils.timeit(
+            lambda: sync.diff_commits(repo, old.hex, new.hex), args.repeat
+        )
+        print(f" diff: {elapsed:10.2f} ms")
+        elapsed = utils.timeit(
+            lambda: sum(1 for _ in sync.walk(repo, repo[new].tree.hex, PurePath())),
+            1,
+        )
+        print(f" walk: {elapsed:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Shared helpers for the benchmark scripts, run them from the project root:
+
+    python -m benchmarks.bench_open --files 200000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.project.settings")
+django.setup()
+
+import pygit2  # noqa: E402
+
+from django.conf import settings  # noqa: E402
+
+
+def build_synthetic_repository(path, files, per_dir=1000, depth=2, size=64):
+    """Bare repository of `files` distinct blobs spread over nested directories.
+
+    Paths look like "d00000/d00001/f00000042.txt", with `per_dir` entries by tree.
+    Return the path of the last blob, the deepest one to resolve.
+    """
+    repo = pygit2.init_repository(str(path), bare=True)
+    padding = b"x" * max(0, size - 10)
+
+    def build(level, start, count):
+        builder = repo.TreeBuilder()
+        if level == depth:
+            for i in range(start, start + count):
+                blob_id = repo.create_blob(b"%09d\n" % i + padding)
+                builder.insert(f"f{i:09d}.txt", blob_id, pygit2.GIT_FILEMODE_BLOB)
+            return builder.write()
+        chunk = per_dir ** (depth - level)
+        for index, child_start in enumerate(range(start, start + count, chunk)):
+            child_count = min(chunk, start + count - child_start)
+            child_id = build(level + 1, child_start, child_count)
+            builder.insert(f"d{index:05d}", child_id, pygit2.GIT_FILEMODE_TREE)
+        return builder.write()
+
+    tree_id = build(0, 0, files)
+    signature = pygit2.Signature("Git Storage", "git@storage")
+    repo.create_commit("HEAD", signature, signature, "Synthetic", tree_id, [])
+
+    last = files - 1
+    segments = []
+    for level in range(depth, 0, -1):
+        segments.append("d{:05d}".format(last // per_dir**level % per_dir))
+    return "/".join(segments + [f"f{last:09d}.txt"])
+
+
+def use_repository(path):
+    settings.GITSTORAGE_REPOSITORY = str(path)
+
+
+def timeit(func, repeat):
+    """Best wall time of `repeat` runs, in milliseconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def argument_parser(description, files=100000):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--files", type=int, default=files, help="number of blobs")
+    parser.add_argument("--per-dir", type=int, default=1000, help="entries by tree")
+    parser.add_argument("--repeat", type=int, default=5, help="runs by measure")
+    return parser
+
+
+def temporary_directory():
+    return tempfile.TemporaryDirectory(prefix="gitstorage-bench")
@@ -27,7 +27,7 @@ admin.site.register(models.Blob, BlobAdmin)
 
 class TreePermissionAdmin(admin.ModelAdmin):
     search_fields = ["parent_path", "name"]
-    list_filter = ["user"]
+    list_filter = ["user", "group", "recursive"]
 
 
 admin.site.register(models.TreePermission, TreePermissionAdmin)
@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.signals import m2m_changed
 
 
 class GitStorageConfig(AppConfig):
     name = "gitstorage"
     verbose_name = "GitStorage"
+
+    def ready(self):
+        from . import models
+
+        # The user model may be swapped, and may have no groups
+        try:
+            groups = get_user_model()._meta.get_field("groups")
+        except FieldDoesNotExist:
+            return
+        m2m_changed.connect(
+            models.invalidate_memberships,
+            sender=groups.remote_field.through,
+            dispatch_uid="gitstorage_invalidate_memberships",
+        )
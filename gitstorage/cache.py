@@ -0,0 +1,180 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Caches for immutable, content-addressed data: a Git object never changes for a given OID.
+"""
+
+from collections import OrderedDict
+import threading
+
+from django.core.cache import caches
+
+
+class LRUCache(object):
+    """Thread-safe mapping evicting the least recently used keys.
+
+    The bound is on the total size of the values, as measured by `sizeof` (1 by
+    default), so a few huge values don't count as much as many small ones.
+    """
+
+    def __init__(self, max_size, sizeof=None):
+        self.max_size = max_size
+        self.sizeof = sizeof or (lambda value: 1)
+        self.data = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                _size, value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        with self.lock:
+            if key in self.data:
+                self.size -= self.data.pop(key)[0]
+            if size > self.max_size:
+                # Would evict everything else for nothing
+                return
+            self.data[key] = (size, value)
+            self.size += size
+            while self.size > self.max_size:
+                _key, (evicted, _value) = self.data.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+
+class TieredCache(object):
+    """In-process LRU cache in front of an optional Django cache shared by workers.
+
+    Keys must be content addressed (OIDs), values never expire.
+    """
+
+    def __init__(self, prefix, max_size, alias=None, sizeof=None):
+        self.prefix = prefix
+        self.local = LRUCache(max_size, sizeof=sizeof)
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @property
+    def shared(self):
+        if not self.alias:
+            return None
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return f"gitstorage:{self.prefix}:{key}"
+
+    def count(self, hits=0, misses=0):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get_or_set(self, key, compute):
+        """Return the cached value, or compute and store it in both layers."""
+        value = self.local.get(key)
+        if value is not None:
+            self.count(hits=1)
+            return value
+
+        shared = self.shared
+        if shared is not None:
+            value = shared.get(self.make_key(key))
+            if value is not None:
+                self.count(hits=1)
+                self.local.set(key, value)
+                return value
+
+        self.count(misses=1)
+        value = compute()
+        self.local.set(key, value)
+        if shared is not None:
+            shared.set(self.make_key(key), value, timeout=None)
+        return value
+
+    def get_or_set_many(self, keys, compute_many):
+        """Like get_or_set, for several keys at once.
+
+        @param compute_many: called with the keys missing in both layers, returns
+            a dictionary of their values
+        @return: dictionary of the values by key
+        """
+        values = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                values[key] = value
+        hits = len(values)
+
+        shared = self.shared
+        if missing and shared is not None:
+            found = shared.get_many([self.make_key(key) for key in missing])
+            still_missing = []
+            for key in missing:
+                value = found.get(self.make_key(key))
+                if value is None:
+                    still_missing.append(key)
+                else:
+                    values[key] = value
+                    self.local.set(key, value)
+                    hits += 1
+            missing = still_missing
+        self.count(hits=hits, misses=len(missing))
+
+        if missing:
+            computed = compute_many(missing)
+            for key, value in computed.items():
+                self.local.set(key, value)
+            if shared is not None:
+                shared.set_many(
+                    {self.make_key(key): value for key, value in computed.items()},
+                    timeout=None,
+                )
+            values.update(computed)
+        return values
+
+    def clear(self):
+        """Only clear the local layer, the shared one is still valid."""
+        self.local.clear()
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
@@ -6,6 +6,38 @@ import appconf
 class AppConf(appconf.AppConf):
     # Path the the repository to browse
     GITSTORAGE_REPOSITORY = "repo"
+    # Tree listings kept in memory by each process, counted in tree entries
+    GITSTORAGE_LISTING_CACHE_SIZE = 100000
+    # Name of a Django cache to share tree listings between processes, if any
+    GITSTORAGE_LISTING_CACHE = None
+    # Blob sizes kept in memory by each process, and Django cache to share them, if any
+    GITSTORAGE_SIZE_CACHE_SIZE = 50000
+    GITSTORAGE_SIZE_CACHE = None
+    # Paths resolved to objects kept in memory by each process, including not found
+    GITSTORAGE_RESOLVE_CACHE_SIZE = 100000
+    # Django cache to share the permissions of users between requests and processes,
+    # None to query them on every request, and the number of users kept in memory
+    GITSTORAGE_PERMISSION_CACHE = None
+    GITSTORAGE_PERMISSION_CACHE_SIZE = 10000
+    # How to send blob data: "stream" in chunks, "memory" all at once, or from the spool:
+    # "file" sent by the WSGI server, "offload" sent by the Web server
+    GITSTORAGE_DOWNLOAD_BACKEND = "stream"
+    # Size of the chunks when streaming blob data
+    GITSTORAGE_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+    # Cache-Control header of downloads and tree pages, permissions may change anytime
+    GITSTORAGE_BLOB_CACHE_CONTROL = "private, no-cache"
+    GITSTORAGE_TREE_CACHE_CONTROL = "private, no-cache"
+    # Directory where blob data is written to be sent as files ("file" and "offload")
+    GITSTORAGE_SPOOL_ROOT = None
+    # Maximum size of the spool in bytes, least recently used files are evicted
+    GITSTORAGE_SPOOL_MAX_SIZE = None
+    # "X-Accel-Redirect" (nginx) or "X-Sendfile" (Apache, lighttpd)
+    GITSTORAGE_OFFLOAD_HEADER = "X-Accel-Redirect"
+    # Internal location of the spool for X-Accel-Redirect
+    GITSTORAGE_OFFLOAD_URL = "/gitstorage-spool/"
+    # Blobs indexed for full-text search: mimetypes by prefix, and maximum size in bytes
+    GITSTORAGE_CONTENT_INDEX_MIMETYPES = ["text/"]
+    GITSTORAGE_CONTENT_INDEX_MAX_SIZE = 1024 * 1024
 
     class Meta:
         # Effing appconf...
@@ -0,0 +1,53 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.core.management.base import BaseCommand
+
+from gitstorage import models
+from gitstorage import repository
+
+
+class Command(BaseCommand):
+    help = "Index the content of the text blobs queued on push, by batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="blobs indexed by transaction",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="stop after about this number of blobs, to run again later",
+        )
+
+    def handle(self, batch_size, limit, verbosity, **options):
+        repo = repository.Repository()
+        pruned = models.IndexedBlob.objects.prune()
+        count = 0
+        while limit is None or count < limit:
+            indexed = models.IndexedBlob.objects.index_batch(repo, batch_size)
+            if not indexed:
+                break
+            count += indexed
+        if verbosity > 0:
+            self.stdout.write(
+                "{0} blobs indexed, {1} pruned, {2} pending".format(
+                    count, pruned, models.IndexedBlob.objects.pending().count()
+                )
+            )
@@ -0,0 +1,60 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gitstorage import models
+from gitstorage import repository
+
+
+class Command(BaseCommand):
+    help = "Rebuild the path metadata from the head commit, or verify it."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="only compare the path metadata with the head commit",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="rows inserted by query",
+        )
+
+    def handle(self, verify, batch_size, verbosity, **options):
+        repo = repository.Repository()
+        if not verify:
+            count = models.PathMetadata.objects.rebuild(repo, batch_size=batch_size)
+            if verbosity > 0:
+                self.stdout.write("{0} paths".format(count))
+            return
+
+        missing, extra, stale = models.PathMetadata.objects.verify(repo)
+        if verbosity > 1:
+            for label, paths in [
+                ("missing", missing),
+                ("extra", extra),
+                ("stale", stale),
+            ]:
+                for path in paths:
+                    self.stdout.write("{0} {1}".format(label, path))
+        if missing or extra or stale:
+            raise CommandError(
+                "{0} missing, {1} extra, {2} stale paths".format(
+                    len(missing), len(extra), len(stale)
+                )
+            )
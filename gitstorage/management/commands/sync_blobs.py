@@ -0,0 +1,65 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import Counter
+
+import pygit2
+
+from django.core.management.base import BaseCommand
+
+from gitstorage import repository
+from gitstorage import sync
+
+
+class Command(BaseCommand):
+    help = "Update the state derived from the repository with the changes of a push."
+
+    def add_arguments(self, parser):
+        parser.add_argument("refname", help="reference updated, refs/heads/master")
+        parser.add_argument("old", help="former commit, zeros for a new branch")
+        parser.add_argument("new", help="new commit, zeros for a deleted branch")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="changes applied by transaction",
+        )
+
+    def handle(self, refname, old, new, batch_size, verbosity, **options):
+        repo = repository.Repository()
+        try:
+            head = repo.references["HEAD"].target
+        except (KeyError, pygit2.GitError):
+            head = None
+        if head != refname:
+            # Only the branch served matters
+            if verbosity > 1:
+                self.stdout.write("{0} is not {1}, skipped".format(refname, head))
+            return
+
+        changes = sync.sync(repo, old, new, refname=refname, batch_size=batch_size)
+        if verbosity > 1:
+            counts = Counter(change.status for change in changes)
+            self.stdout.write(
+                ", ".join(
+                    "{0} {1}".format(counts[status], status)
+                    for status in (
+                        sync.ADDED,
+                        sync.MODIFIED,
+                        sync.DELETED,
+                        sync.RENAMED,
+                    )
+                )
+            )
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+def remove_duplicate_permissions(apps, schema_editor):
+    """Keep the first of identical permissions, before they are made unique."""
+    TreePermission = apps.get_model("gitstorage", "TreePermission")
+    duplicates = (
+        TreePermission.objects.values("parent_path", "name", "user")
+        .annotate(first=models.Min("pk"), count=models.Count("pk"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        TreePermission.objects.filter(
+            parent_path=duplicate["parent_path"],
+            name=duplicate["name"],
+            user=duplicate["user"],
+        ).exclude(pk=duplicate["first"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitstorage", "0004_auto_20200921_1520"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_permissions, migrations.RunPython.noop),
+    ]
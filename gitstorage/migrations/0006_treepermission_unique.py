@@ -0,0 +1,28 @@
+# Generated by Django 3.1.14 on 2026-10-17 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitstorage", "0005_remove_duplicate_permissions"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="treepermission",
+            constraint=models.UniqueConstraint(
+                fields=("parent_path", "name", "user"),
+                name="gitstorage_treepermission_unique",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="treepermission",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(user=None),
+                fields=("parent_path", "name"),
+                name="gitstorage_treepermission_unique_anonymous",
+            ),
+        ),
+    ]
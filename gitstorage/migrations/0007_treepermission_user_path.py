@@ -0,0 +1,55 @@
+# Generated by Django 3.1.14 on 2026-10-17 17:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import gitstorage.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("gitstorage", "0006_treepermission_unique"),
+    ]
+
+    operations = [
+        # Before the single column indexes are dropped
+        migrations.AddIndex(
+            model_name="treepermission",
+            index=models.Index(
+                fields=["user", "parent_path", "name"], name="gitstorage_tp_user_path"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="treepermission",
+            name="name",
+            field=models.CharField(
+                blank=True,
+                max_length=256,
+                validators=[gitstorage.validators.name_validator],
+                verbose_name="name",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="treepermission",
+            name="parent_path",
+            field=models.CharField(
+                blank=True,
+                max_length=2048,
+                validators=[gitstorage.validators.path_validator],
+                verbose_name="parent path",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="treepermission",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.1.14 on 2026-10-17 17:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("gitstorage", "0007_treepermission_user_path"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="treepermission",
+            name="gitstorage_treepermission_unique_anonymous",
+        ),
+        migrations.AddField(
+            model_name="treepermission",
+            name="group",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="auth.group",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="treepermission",
+            index=models.Index(
+                fields=["group", "parent_path", "name"], name="gitstorage_tp_group_path"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="treepermission",
+            constraint=models.UniqueConstraint(
+                fields=("parent_path", "name", "group"),
+                name="gitstorage_treepermission_unique_group",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="treepermission",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("group", None), ("user", None)),
+                fields=("parent_path", "name"),
+                name="gitstorage_treepermission_unique_anonymous",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="treepermission",
+            constraint=models.CheckConstraint(
+                check=models.Q(("user", None), ("group", None), _connector="OR"),
+                name="gitstorage_treepermission_user_or_group",
+            ),
+        ),
+    ]
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from django.db import migrations, models
+
+
+def materialize_paths(apps, schema_editor):
+    TreePermission = apps.get_model("gitstorage", "TreePermission")
+    batch = []
+    for permission in TreePermission.objects.only("parent_path", "name").iterator():
+        permission.path = str(Path(permission.parent_path) / permission.name)
+        batch.append(permission)
+        if len(batch) == 1000:
+            TreePermission.objects.bulk_update(batch, ["path"])
+            batch = []
+    TreePermission.objects.bulk_update(batch, ["path"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitstorage", "0008_treepermission_group"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="treepermission",
+            name="recursive",
+            field=models.BooleanField(
+                default=False,
+                help_text="Also allow on every subtree.",
+                verbose_name="recursive",
+            ),
+        ),
+        migrations.AddField(
+            model_name="treepermission",
+            name="path",
+            field=models.CharField(
+                default="", editable=False, max_length=2305, verbose_name="path"
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(materialize_paths, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="treepermission",
+            name="gitstorage_tp_user_path",
+        ),
+        migrations.RemoveIndex(
+            model_name="treepermission",
+            name="gitstorage_tp_group_path",
+        ),
+        migrations.AddIndex(
+            model_name="treepermission",
+            index=models.Index(
+                fields=["user", "parent_path", "name", "recursive"],
+                name="gitstorage_tp_user_path",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="treepermission",
+            index=models.Index(
+                fields=["group", "parent_path", "name", "recursive"],
+                name="gitstorage_tp_group_path",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="treepermission",
+            index=models.Index(
+                condition=models.Q(recursive=True),
+                fields=["path"],
+                name="gitstorage_tp_recursive_path",
+            ),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 3.1.14 on 2026-10-17 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitstorage", "0009_treepermission_recursive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PathMetadata",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "parent_path",
+                    models.CharField(max_length=2048, verbose_name="parent path"),
+                ),
+                ("name", models.CharField(max_length=256, verbose_name="name")),
+                (
+                    "path",
+                    models.CharField(max_length=2305, unique=True, verbose_name="path"),
+                ),
+                ("hex", models.CharField(max_length=40, verbose_name="OID")),
+                (
+                    "type",
+                    models.PositiveSmallIntegerField(
+                        choices=[(2, "tree"), (3, "blob")], verbose_name="type"
+                    ),
+                ),
+                (
+                    "size",
+                    models.BigIntegerField(blank=True, null=True, verbose_name="size"),
+                ),
+                (
+                    "mimetype",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="mimetype"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "path metadata",
+                "verbose_name_plural": "path metadata",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="pathmetadata",
+            index=models.Index(
+                fields=["parent_path", "name"], name="gitstorage_pm_parent_path"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pathmetadata",
+            index=models.Index(fields=["mimetype"], name="gitstorage_pm_mimetype"),
+        ),
+    ]
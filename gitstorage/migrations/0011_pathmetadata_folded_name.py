@@ -0,0 +1,42 @@
+import unicodedata
+
+from django.db import migrations, models
+
+
+def fold(text):
+    """Copy of gitstorage.search.fold as of this migration."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(
+        char for char in decomposed if not unicodedata.combining(char)
+    ).casefold()
+
+
+def fold_names(apps, schema_editor):
+    PathMetadata = apps.get_model("gitstorage", "PathMetadata")
+    batch = []
+    for metadata in PathMetadata.objects.only("name").iterator():
+        metadata.folded_name = fold(metadata.name)
+        batch.append(metadata)
+        if len(batch) == 1000:
+            PathMetadata.objects.bulk_update(batch, ["folded_name"])
+            batch = []
+    PathMetadata.objects.bulk_update(batch, ["folded_name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitstorage", "0010_pathmetadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pathmetadata",
+            name="folded_name",
+            field=models.CharField(
+                db_index=True, default="", max_length=256, verbose_name="folded name"
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fold_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 3.1.14 on 2026-10-17 18:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitstorage", "0011_pathmetadata_folded_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentTerm",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("term", models.CharField(max_length=64, verbose_name="term")),
+            ],
+            options={
+                "verbose_name": "content term",
+                "verbose_name_plural": "content terms",
+            },
+        ),
+        migrations.CreateModel(
+            name="IndexedBlob",
+            fields=[
+                (
+                    "id",
+                    models.CharField(
+                        editable=False, max_length=40, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "status",
+                    models.PositiveSmallIntegerField(
+                        choices=[(0, "pending"), (1, "indexed"), (2, "skipped")],
+                        default=0,
+                        verbose_name="status",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "indexed blob",
+                "verbose_name_plural": "indexed blobs",
+            },
+        ),
+        migrations.AlterField(
+            model_name="pathmetadata",
+            name="hex",
+            field=models.CharField(db_index=True, max_length=40, verbose_name="OID"),
+        ),
+        migrations.AddIndex(
+            model_name="indexedblob",
+            index=models.Index(
+                condition=models.Q(status=0),
+                fields=["id"],
+                name="gitstorage_ib_pending",
+            ),
+        ),
+        migrations.AddField(
+            model_name="contentterm",
+            name="blob",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="gitstorage.indexedblob"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="contentterm",
+            constraint=models.UniqueConstraint(
+                fields=("term", "blob"), name="gitstorage_contentterm_unique"
+            ),
+        ),
+    ]
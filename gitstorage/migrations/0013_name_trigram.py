@@ -0,0 +1,59 @@
+# Generated by Django 3.1.14 on 2026-10-17 18:48
+
+from django.db import migrations, models
+
+
+def index_names(apps, schema_editor):
+    PathMetadata = apps.get_model("gitstorage", "PathMetadata")
+    NameTrigram = apps.get_model("gitstorage", "NameTrigram")
+    names = PathMetadata.objects.values_list("folded_name", flat=True).distinct()
+    batch = []
+    for folded_name in names.iterator():
+        for i in range(len(folded_name) - 2):
+            batch.append(
+                NameTrigram(trigram=folded_name[i : i + 3], folded_name=folded_name)
+            )
+        if len(batch) >= 1000:
+            NameTrigram.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    NameTrigram.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitstorage", "0012_content_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NameTrigram",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("trigram", models.CharField(max_length=3, verbose_name="trigram")),
+                (
+                    "folded_name",
+                    models.CharField(max_length=256, verbose_name="folded name"),
+                ),
+            ],
+            options={
+                "verbose_name": "name trigram",
+                "verbose_name_plural": "name trigrams",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="nametrigram",
+            constraint=models.UniqueConstraint(
+                fields=("trigram", "folded_name"), name="gitstorage_nametrigram_unique"
+            ),
+        ),
+        migrations.RunPython(index_names, migrations.RunPython.noop),
+    ]
@@ -13,12 +13,22 @@
 #    You should have received a copy of the GNU General Public License
 #    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
 
-from pathlib import Path
+import itertools
+from pathlib import Path, PurePath
 
-from django.db import models
+import pygit2
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
 from . import mimetypes
+from . import permissions
+from . import search
+from . import signals
+from . import sync
 from . import validators
 from .conf import settings
 
@@ -72,44 +82,263 @@ class Tree(BaseObject):
         return self.id
 
 
+class ListingEntry(object):
+    """Tree entry listed in a page, much cheaper to build than a model instance.
+
+    The path, mimetype and model instances are only built when asked for, by a
+    template most likely. Items are the attributes, for compatibility with the
+    dictionaries formerly listed: entry["name"], entry["blob"], etc.
+    """
+
+    __slots__ = ("name", "parent", "hex", "type", "_size", "_mimetype", "_object")
+
+    def __init__(self, name, parent: Path, hex, type, size=None):
+        self.name = name
+        self.parent = parent
+        self.hex = hex
+        self.type = type
+        self._size = size
+        self._mimetype = None
+        self._object = None
+
+    def __repr__(self):
+        return "<ListingEntry {0}>".format(self.path)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    @property
+    def path(self):
+        return str(self.parent / self.name)
+
+    @property
+    def id(self):
+        return self.hex
+
+    @property
+    def size(self):
+        return self._size
+
+    def guess_type(self):
+        if not self._mimetype:
+            mimetype, encoding = mimetypes.guess_type(self.name)
+            self._mimetype = (mimetype or "application/octet-stream", encoding)
+        return self._mimetype
+
+    @property
+    def mimetype(self):
+        return self.guess_type()[0]
+
+    @property
+    def encoding(self):
+        return self.guess_type()[1]
+
+    @property
+    def blob(self):
+        if self._object is None:
+            self._object = Blob(pk=self.hex, name=self.name, size=self._size)
+        return self._object
+
+    @property
+    def tree(self):
+        if self._object is None:
+            self._object = Tree(pk=self.hex)
+        return self._object
+
+
+class ListingPage(list):
+    """Page of listing entries, knowing the total number of entries.
+
+    The next cursor is the name of the last entry, None on the last page.
+    """
+
+    def __init__(self, entries, total, next_cursor=None):
+        super().__init__(entries)
+        self.total = total
+        self.next_cursor = next_cursor
+
+
+def grantee_filter(user):
+    """Permissions of the user, granted directly or to one of their groups.
+
+    Groups are matched with a subquery on the membership table, a single semi-join.
+    Anonymous users only get the permissions granted to no user and no group.
+    """
+    if not user or not user.is_authenticated:
+        return models.Q(user=None, group=None)
+    q = models.Q(user=user)
+    memberships = group_memberships(user)
+    if memberships is not None:
+        q |= models.Q(group__in=memberships)
+    return q
+
+
+def group_memberships(user):
+    """Subquery of the groups of the user, None if the user model has no groups."""
+    try:
+        field = user._meta.get_field("groups")
+    except FieldDoesNotExist:
+        return None
+    return field.remote_field.through.objects.filter(
+        **{field.m2m_field_name(): user.pk}
+    ).values(field.m2m_reverse_field_name())
+
+
+def path_filter(path: Path):
+    """Permissions on the path, granted on it or inherited from one of its ancestors.
+
+    Ancestors are looked up by their materialized path, in a single IN lookup.
+    """
+    path = Path(path)
+    return models.Q(parent_path=path.parent, name=path.name) | models.Q(
+        recursive=True, path__in=permissions.ancestors(path)[1:]
+    )
+
+
+def below_filter(path):
+    """Paths below the given one, a case-sensitive prefix match.
+
+    "/" is followed by "0", under a binary collation the range holds every path
+    starting with path + "/", where a LIKE would ignore the case on SQLite. Under
+    other collations the range may hold other paths, the LIKE rules them out.
+    """
+    return models.Q(
+        path__gte=path + "/", path__lt=path + "0", path__startswith=path + "/"
+    )
+
+
+def grantees_filter(users, groups):
+    """Permissions granted to any of the users (None for anonymous) or groups."""
+    q = models.Q(user__in=[user for user in users if user is not None]) | models.Q(
+        group__in=groups
+    )
+    if None in users:
+        q |= models.Q(user=None, group=None)
+    return q
+
+
+def exact_paths_filter(paths):
+    """Permissions granted on any of the paths, not inherited."""
+    q = models.Q()
+    for path in paths:
+        q |= models.Q(parent_path=path.parent, name=path.name)
+    return q
+
+
+def invalidate_users(users, groups=()):
+    """Invalidate the cached permissions of the users, of everyone for many users.
+
+    Members of groups are many users.
+    """
+    if len(users) == 1 and not groups:
+        (user,) = users
+        permissions.invalidate(user.pk if user else None)
+    elif users or groups:
+        permissions.invalidate(all_users=True)
+
+
+def visible_filter(index):
+    """Path metadata visible with the permission index of a user.
+
+    Trees the user is allowed on, and the blobs in them, as when browsing. Paths are
+    taken from the index, the filtering is left to the database.
+    """
+    if index.is_unrestricted:
+        return models.Q()
+    exact, recursive = index.granted_paths()
+    if "." in recursive:
+        return models.Q()
+    q = models.Q(type=pygit2.GIT_OBJ_TREE, path__in=exact) | models.Q(
+        type=pygit2.GIT_OBJ_BLOB, parent_path__in=exact
+    )
+    for path in recursive:
+        q |= models.Q(path=path) | below_filter(path)
+    return q
+
+
 class TreePermissionQuerySet(models.QuerySet):
     def current_permissions(self, path: Path, **kwargs):
         return self.filter(
             parent_path=path.parent, name=path.name, **kwargs
-        ).select_related("user")
+        ).select_related("user", "group")
+
+    def in_tree(self, user, parent_path: Path, **kwargs):
+        """Permissions of the user on the trees in the given tree, or inherited by it."""
+        return self.filter(
+            models.Q(parent_path=parent_path)
+            | models.Q(recursive=True, path__in=permissions.ancestors(parent_path)),
+            grantee_filter(user),
+            **kwargs
+        )
 
     def allowed_names(self, user, parent_path: Path, **kwargs):
         if user:
             if user.is_superuser:
                 # Reads as no restriction
                 return None
-            if not user.is_authenticated:
-                user = None
-        return self.filter(parent_path=parent_path, user=user, **kwargs).values_list(
-            "name", flat=True
-        )
+        ancestors = permissions.ancestors(parent_path)
+        names = []
+        for path, name in self.in_tree(user, parent_path, **kwargs).values_list(
+            "path", "name"
+        ):
+            if path in ancestors:
+                # Inherited by the whole tree
+                return None
+            names.append(name)
+        return names
 
     def allowed_paths(self, user):
         if user:
             if user.is_superuser:
                 # Reads as no restriction
                 return None
-            if not user.is_authenticated:
-                user = None
-        all_permissions = self.filter(user=user).values_list("parent_path", "name")
-        return ["/".join(filter(None, segments)) for segments in all_permissions]
+        all_permissions = self.granted_paths(user)
+        return [
+            "/".join(filter(None, (parent_path, name)))
+            for parent_path, name, _recursive in all_permissions
+        ]
+
+    def granted_paths(self, user):
+        """(parent_path, name, recursive) of every permission of the user, in a single query.
+
+        Permissions granted to the user and to their groups are read from their own
+        index, in a union, databases don't use both indexes for an OR.
+        """
+        fields = ("parent_path", "name", "recursive")
+        if not user or not user.is_authenticated:
+            return self.filter(user=None, group=None).values_list(*fields)
+        return (
+            self.filter(user=user)
+            .values_list(*fields)
+            .union(self.filter(group__user=user).values_list(*fields), all=True)
+        )
+
+    def index(self, user):
+        """All the permissions of the user in a single query, see PermissionIndex.
+
+        Indexes are cached across requests if GITSTORAGE_PERMISSION_CACHE is set.
+        """
+        if user:
+            if user.is_superuser:
+                return permissions.PermissionIndex(None)
+
+        def load():
+            return permissions.PermissionIndex(self.granted_paths(user))
+
+        return permissions.permission_cache.get_index(
+            user.pk if user and user.is_authenticated else None, load
+        )
 
     def for_user(self, user, path: Path, **kwargs):
-        if user and not user.is_authenticated:
-            user = None
-        qs = self.filter(user=user, parent_path=path.parent, name=path.name, **kwargs)
+        qs = self.filter(grantee_filter(user), path_filter(path), **kwargs)
         return qs
 
     def other_permissions(self, user, path: Path, **kwargs):
-        if user and not user.is_authenticated:
-            user = None
         return (
-            self.filter(user=user, parent_path=path.parent, **kwargs)
+            self.filter(grantee_filter(user), parent_path=path.parent, **kwargs)
             .exclude(name=path.name)
             .exists()
         )
@@ -119,32 +348,108 @@ class TreePermissionQuerySet(models.QuerySet):
             return True
         return self.for_user(user, path, **kwargs).exists()
 
+    def grant(self, users, paths, groups=(), recursive=False):
+        """Allow every user and group on every path, in a single query by batch of rows.
+
+        Existing permissions are ignored thanks to the unique constraints, or made
+        recursive with a single update.
+
+        @param users: users, None for anonymous
+        @param paths: tree paths
+        @param groups: groups, one row for all of their members
+        @param recursive: also allow on every subtree, now and to come
+        """
+        users = list(users)
+        groups = list(groups)
+        paths = [Path(path) for path in paths]
+        if recursive and paths:
+            self.filter(
+                grantees_filter(users, groups), exact_paths_filter(paths)
+            ).update(recursive=True)
+        self.bulk_create(
+            [
+                TreePermission(
+                    parent_path=path.parent,
+                    name=path.name,
+                    path=str(path),
+                    recursive=recursive,
+                    **grantee
+                )
+                for path in paths
+                for grantee in (
+                    [{"user": user} for user in users]
+                    + [{"group": group} for group in groups]
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        invalidate_users(users, groups)
+
+    def revoke(self, users, paths, groups=()):
+        """Disallow every user and group on every path, in a single delete.
+
+        Permissions inherited from ancestors are kept. Rows are deleted without
+        sending post_delete for each one, caches are invalidated once per user.
+
+        @param users: users, None for anonymous
+        @param paths: tree paths
+        @param groups: groups, their members keep the permissions granted to them
+        """
+        users = list(users)
+        groups = list(groups)
+        paths = [Path(path) for path in paths]
+        if paths:
+            self.filter(
+                grantees_filter(users, groups), exact_paths_filter(paths)
+            )._raw_delete(self.db)
+        invalidate_users(users, groups)
+
+    def in_subtree(self, path: Path):
+        """Permissions on the tree and on every tree below it."""
+        path = str(Path(path))
+        return self.filter(models.Q(path=path) | below_filter(path))
+
+    def move(self, old_path: Path, new_path: Path):
+        """Follow a tree moved, with its subtrees, to a new path.
+
+        Permissions left at the new path by a former tree are replaced.
+        """
+        old_path, new_path = str(Path(old_path)), str(Path(new_path))
+        moved = list(self.in_subtree(old_path))
+        if not moved:
+            return
+        # Every user is invalidated below
+        self.in_subtree(new_path)._raw_delete(self.db)
+        for permission in moved:
+            path = Path(new_path + permission.path[len(old_path) :])
+            permission.parent_path = str(path.parent)
+            permission.name = path.name
+            permission.path = str(path)
+        self.bulk_update(moved, ["parent_path", "name", "path"])
+        permissions.invalidate(all_users=True)
+
     def add(self, users, path: Path):
-        for user in users:
-            self.get_or_create(parent_path=path.parent, name=path.name, user=user)
+        self.grant(users, [path])
 
     def remove(self, users, path: Path):
-        # Does not work for [None]
-        if users == [None]:
-            self.filter(parent_path=path.parent, name=path.name, user=None).delete()
-        else:
-            self.filter(
-                parent_path=path.parent, name=path.name, user__in=users
-            ).delete()
+        self.revoke(users, [path])
+
+    def update(self, **kwargs):
+        # Any user may be affected, bulk deletes are caught by the signals
+        permissions.invalidate(all_users=True)
+        return super().update(**kwargs)
 
 
 class TreePermission(models.Model):
     parent_path = models.CharField(
         _("parent path"),
         max_length=2048,
-        db_index=True,
         blank=True,
         validators=[validators.path_validator],
     )
     name = models.CharField(
         _("name"),
         max_length=256,
-        db_index=True,
         blank=True,
         validators=[validators.name_validator],
     )
@@ -153,14 +458,496 @@ class TreePermission(models.Model):
         null=True,  # For anonymous user
         blank=True,
         on_delete=models.CASCADE,
+        # Leading column of the index below
+        db_index=False,
+    )
+    group = models.ForeignKey(
+        "auth.Group",
+        null=True,  # Granted to a single user
+        blank=True,
+        on_delete=models.CASCADE,
+        db_index=False,
     )
+    recursive = models.BooleanField(
+        _("recursive"),
+        default=False,
+        help_text=_("Also allow on every subtree."),
+    )
+    # Materialized parent_path / name, to look up permissions inherited from ancestors
+    path = models.CharField(_("path"), max_length=2048 + 1 + 256, editable=False)
 
     objects = TreePermissionQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("tree permission")
         verbose_name_plural = _("tree permissions")
+        indexes = [
+            # Permissions of a user by tree, and names allowed in a tree, are read from
+            # the index only
+            models.Index(
+                fields=["user", "parent_path", "name", "recursive"],
+                name="gitstorage_tp_user_path",
+            ),
+            models.Index(
+                fields=["group", "parent_path", "name", "recursive"],
+                name="gitstorage_tp_group_path",
+            ),
+            # Only a few trees are shared with their subtrees
+            models.Index(
+                fields=["path"],
+                condition=models.Q(recursive=True),
+                name="gitstorage_tp_recursive_path",
+            ),
+        ]
+        constraints = [
+            # Also the index of permissions by path, current_permissions and for_user
+            models.UniqueConstraint(
+                fields=["parent_path", "name", "user"],
+                name="gitstorage_treepermission_unique",
+            ),
+            models.UniqueConstraint(
+                fields=["parent_path", "name", "group"],
+                name="gitstorage_treepermission_unique_group",
+            ),
+            # NULL users and groups are distinct for the constraints above
+            models.UniqueConstraint(
+                fields=["parent_path", "name"],
+                condition=models.Q(user=None, group=None),
+                name="gitstorage_treepermission_unique_anonymous",
+            ),
+            models.CheckConstraint(
+                check=models.Q(user=None) | models.Q(group=None),
+                name="gitstorage_treepermission_user_or_group",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.path = permissions.materialized_path(self.parent_path, self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         path = Path(self.parent_path) / self.name
-        return "{0} on {1}".format(self.user, path)
+        return "{0} on {1}".format(self.group if self.group_id else self.user, path)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class PathMetadataQuerySet(models.QuerySet):
+    def children(self, parent_path: Path, **kwargs):
+        """Entries of the given tree, sorted by name."""
+        return self.filter(parent_path=str(Path(parent_path)), **kwargs).order_by(
+            "name"
+        )
+
+    def in_subtree(self, path: Path):
+        """Entries below the given tree, the whole repository for the root."""
+        path = str(Path(path))
+        if path == ".":
+            return self.all()
+        return self.filter(below_filter(path))
+
+    def visible(self, index):
+        """Entries the user of the permission index may see."""
+        return self.filter(visible_filter(index))
+
+    def not_hidden(self):
+        """Without hidden blobs and trees, nor anything in hidden trees."""
+        return self.exclude(
+            models.Q(path__startswith=".") | models.Q(path__contains="/.")
+        )
+
+    def search(self, query, mode=search.PREFIX):
+        """Entries whose name starts with, or contains, the query, or blobs whose
+        content contains its words.
+
+        Names and query are compared folded, insensitive to case and accents. Prefixes
+        are matched as a range of the folded name index, substrings from the names
+        having every trigram of the query. Queries shorter than a trigram match
+        prefixes only.
+        """
+        if mode == search.CONTENT:
+            return self.containing(query)
+        query = search.fold(query)
+        if mode == search.SUBSTRING and len(query) >= search.TRIGRAM_LENGTH:
+            matches = self.filter(folded_name__contains=query)
+            for trigram in sorted(search.trigrams(query)):
+                matches = matches.filter(
+                    folded_name__in=NameTrigram.objects.filter(trigram=trigram).values(
+                        "folded_name"
+                    )
+                )
+        else:
+            matches = self.filter(
+                folded_name__gte=query,
+                folded_name__lt=query + search.MAX_CHAR,
+                # The range is only an index hint under other collations
+                folded_name__startswith=query,
+            )
+        return matches.order_by("folded_name", "path")
+
+    def containing(self, text):
+        """Blobs whose indexed content contains every word of the text."""
+        words = search.terms(text)
+        if not words:
+            return self.none()
+        matches = self.filter(type=pygit2.GIT_OBJ_BLOB)
+        for word in sorted(words):
+            matches = matches.filter(
+                hex__in=ContentTerm.objects.filter(term=word).values("blob_id")
+            )
+        return matches.order_by("folded_name", "path")
+
+    def from_entries(self, repo, entries):
+        """Unsaved rows for the (path, type, hex) entries, blob sizes read in a batch."""
+        entries = list(entries)
+        sizes = repo.read_sizes(
+            [hex for _path, type, hex in entries if type == pygit2.GIT_OBJ_BLOB]
+        )
+        return [
+            PathMetadata.from_entry(path, type, hex, sizes.get(hex))
+            for path, type, hex in entries
+        ]
+
+    def apply(self, repo, changes):
+        """Update the rows with the changes pushed, one delete and one insert.
+
+        New paths are deleted too, applying the same changes twice is harmless.
+
+        @param changes: list of sync.Change
+        @return: the rows inserted
+        """
+        removed = {
+            str(path)
+            for change in changes
+            for path in (change.old_path, change.new_path)
+            if path
+        }
+        if removed:
+            self.filter(path__in=removed).delete()
+        rows = self.bulk_create(
+            self.from_entries(
+                repo,
+                [
+                    (change.new_path, change.type, change.new_hex)
+                    for change in changes
+                    if change.new_path
+                ],
+            )
+        )
+        NameTrigram.objects.add(row.folded_name for row in rows)
+        return rows
+
+    def rebuild(self, repo, batch_size=1000):
+        """Replace every row with the entries of the head tree, in a transaction.
+
+        New text blobs are queued for indexing.
+
+        @return: number of rows
+        """
+        count = 0
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            NameTrigram.objects.all().delete()
+            entries = sync.walk(repo, repo.head.peel(pygit2.Tree).hex, PurePath())
+            for chunk in chunked(entries, batch_size):
+                rows = self.bulk_create(self.from_entries(repo, chunk))
+                NameTrigram.objects.add(row.folded_name for row in rows)
+                IndexedBlob.objects.enqueue(rows)
+                count += len(chunk)
+        return count
+
+    def verify(self, repo):
+        """Compare the rows with the entries of the head tree.
+
+        @return: (missing, extra, stale) sorted lists of paths
+        """
+        expected = {
+            str(path): (type, hex)
+            for path, type, hex in sync.walk(
+                repo, repo.head.peel(pygit2.Tree).hex, PurePath()
+            )
+        }
+        actual = {
+            path: (type, hex)
+            for path, type, hex in self.values_list("path", "type", "hex").iterator()
+        }
+        missing = sorted(expected.keys() - actual.keys())
+        extra = sorted(actual.keys() - expected.keys())
+        stale = sorted(
+            path
+            for path in expected.keys() & actual.keys()
+            if expected[path] != actual[path]
+        )
+        return missing, extra, stale
+
+
+class PathMetadata(models.Model):
+    """Blob or tree at a path of the head commit, to query the repository in SQL.
+
+    Kept up to date on push by the sync_blobs command.
+    """
+
+    TYPE_CHOICES = [
+        (pygit2.GIT_OBJ_TREE, _("tree")),
+        (pygit2.GIT_OBJ_BLOB, _("blob")),
+    ]
+
+    parent_path = models.CharField(_("parent path"), max_length=2048)
+    name = models.CharField(_("name"), max_length=256)
+    # Name insensitive to case and accents, to search
+    folded_name = models.CharField(_("folded name"), max_length=256, db_index=True)
+    path = models.CharField(_("path"), max_length=2048 + 1 + 256, unique=True)
+    hex = models.CharField(_("OID"), max_length=40, db_index=True)
+    type = models.PositiveSmallIntegerField(_("type"), choices=TYPE_CHOICES)
+    # Blobs only
+    size = models.BigIntegerField(_("size"), null=True, blank=True)
+    mimetype = models.CharField(_("mimetype"), max_length=255, blank=True)
+
+    objects = PathMetadataQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("path metadata")
+        verbose_name_plural = _("path metadata")
+        indexes = [
+            models.Index(
+                fields=["parent_path", "name"], name="gitstorage_pm_parent_path"
+            ),
+            models.Index(fields=["mimetype"], name="gitstorage_pm_mimetype"),
+        ]
+
+    def __str__(self):
+        return self.path
+
+    @classmethod
+    def from_entry(cls, path, type, hex, size=None):
+        path = PurePath(path)
+        mimetype = ""
+        if type == pygit2.GIT_OBJ_BLOB:
+            mimetype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        return cls(
+            parent_path=str(path.parent),
+            name=path.name,
+            folded_name=search.fold(path.name),
+            path=str(path),
+            hex=hex,
+            type=type,
+            size=size,
+            mimetype=mimetype,
+        )
+
+    def to_entry(self):
+        """The listing entry, without reading the repository."""
+        return ListingEntry(
+            self.name, Path(self.parent_path), self.hex, self.type, self.size
+        )
+
+
+class NameTrigramQuerySet(models.QuerySet):
+    def add(self, folded_names):
+        """Index the trigrams of the names, once by name whatever its paths.
+
+        Names no longer at any path are left until the next rebuild, they match no
+        path metadata.
+        """
+        self.bulk_create(
+            [
+                NameTrigram(trigram=trigram, folded_name=folded_name)
+                for folded_name in set(folded_names)
+                for trigram in search.trigrams(folded_name)
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+class NameTrigram(models.Model):
+    """Trigram of a folded name, to search names by substring."""
+
+    trigram = models.CharField(_("trigram"), max_length=search.TRIGRAM_LENGTH)
+    folded_name = models.CharField(_("folded name"), max_length=256)
+
+    objects = NameTrigramQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("name trigram")
+        verbose_name_plural = _("name trigrams")
+        constraints = [
+            # Also the index of names by trigram
+            models.UniqueConstraint(
+                fields=["trigram", "folded_name"],
+                name="gitstorage_nametrigram_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return self.trigram
+
+
+class IndexedBlobQuerySet(models.QuerySet):
+    def enqueue(self, metadata):
+        """Queue the text blobs of the path metadata for indexing, once by OID."""
+        self.bulk_create(
+            [
+                IndexedBlob(pk=hex)
+                for hex in {
+                    row.hex
+                    for row in metadata
+                    if row.type == pygit2.GIT_OBJ_BLOB
+                    and search.is_indexable(row.mimetype, row.size)
+                }
+            ],
+            ignore_conflicts=True,
+        )
+
+    def pending(self):
+        return self.filter(status=IndexedBlob.PENDING).order_by("pk")
+
+    def prune(self):
+        """Forget blobs no longer at any path, and their terms.
+
+        @return: number of blobs
+        """
+        orphans = self.exclude(pk__in=PathMetadata.objects.values("hex"))
+        ContentTerm.objects.filter(blob__in=orphans).delete()
+        count, _deleted = orphans.delete()
+        return count
+
+    def index_batch(self, repo, batch_size=100):
+        """Index the words of the next pending blobs, in a transaction.
+
+        Interrupted, only the current batch is indexed again. Concurrent workers skip
+        the blobs locked by each other, where the database supports it.
+
+        @return: number of blobs indexed or skipped, 0 when the queue is empty
+        """
+        with transaction.atomic(using=self.db):
+            batch = list(
+                self.pending().select_for_update(skip_locked=True)[:batch_size]
+            )
+            terms = []
+            for blob in batch:
+                try:
+                    text = search.decode(repo[blob.pk].data)
+                except KeyError:
+                    text = None
+                if text is None:
+                    blob.status = IndexedBlob.SKIPPED
+                    continue
+                blob.status = IndexedBlob.INDEXED
+                terms.extend(
+                    ContentTerm(term=term, blob=blob) for term in search.terms(text)
+                )
+            ContentTerm.objects.bulk_create(
+                terms, batch_size=1000, ignore_conflicts=True
+            )
+            self.bulk_update(batch, ["status"])
+        return len(batch)
+
+
+class IndexedBlob(BaseObject):
+    """Text blob in the full-text index, indexed once whatever its paths."""
+
+    PENDING = 0
+    INDEXED = 1
+    SKIPPED = 2  # Binary or gone
+    STATUS_CHOICES = [
+        (PENDING, _("pending")),
+        (INDEXED, _("indexed")),
+        (SKIPPED, _("skipped")),
+    ]
+
+    status = models.PositiveSmallIntegerField(
+        _("status"), choices=STATUS_CHOICES, default=PENDING
+    )
+
+    objects = IndexedBlobQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("indexed blob")
+        verbose_name_plural = _("indexed blobs")
+        indexes = [
+            # The queue is the few blobs pending
+            models.Index(
+                fields=["id"],
+                condition=models.Q(status=0),  # PENDING
+                name="gitstorage_ib_pending",
+            ),
+        ]
+
+    def __str__(self):
+        return self.id
+
+
+class ContentTerm(models.Model):
+    """Word of the content of a blob, the inverted index."""
+
+    term = models.CharField(_("term"), max_length=search.MAX_TERM_LENGTH)
+    blob = models.ForeignKey(IndexedBlob, on_delete=models.CASCADE)
+
+    class Meta:
+        verbose_name = _("content term")
+        verbose_name_plural = _("content terms")
+        constraints = [
+            # Also the index of blobs by term
+            models.UniqueConstraint(
+                fields=["term", "blob"], name="gitstorage_contentterm_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+@receiver(post_save, sender=TreePermission)
+@receiver(post_delete, sender=TreePermission)
+def invalidate_permissions(sender, instance, **kwargs):
+    if instance.group_id:
+        permissions.invalidate(all_users=True)
+    else:
+        permissions.invalidate(instance.user_id)
+
+
+def invalidate_memberships(sender, instance, reverse, action, **kwargs):
+    """Joining or leaving a group changes the permissions of the user.
+
+    Connected to the groups of the user model when the application is ready.
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # Members of a group
+        permissions.invalidate(all_users=True)
+    else:
+        permissions.invalidate(instance.pk)
+
+
+@receiver(signals.changes_synced)
+def sync_permissions(sender, changes, **kwargs):
+    """Move the permissions of trees renamed, and delete those of trees deleted."""
+    handled = set()
+    for change in changes:
+        if change.type != pygit2.GIT_OBJ_TREE or change.status not in (
+            sync.RENAMED,
+            sync.DELETED,
+        ):
+            continue
+        if handled.intersection(change.old_path.parents):
+            # Already moved or deleted with its parent
+            continue
+        handled.add(change.old_path)
+        if change.status == sync.RENAMED:
+            TreePermission.objects.move(change.old_path, change.new_path)
+        else:
+            TreePermission.objects.in_subtree(change.old_path).delete()
+
+
+@receiver(signals.changes_synced)
+def sync_metadata(sender, repo, changes, **kwargs):
+    IndexedBlob.objects.enqueue(PathMetadata.objects.apply(repo, changes))
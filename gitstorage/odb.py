@@ -0,0 +1,222 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Read object headers (type and size) straight from the object database files.
+
+libgit2 has git_odb_read_header but pygit2 doesn't expose it. Getting the size of a
+blob through pygit2 inflates the whole content, which is a waste for listing sizes.
+"""
+
+import mmap
+import os
+import struct
+import zlib
+
+import pygit2
+
+TYPE_NAMES = {
+    pygit2.GIT_OBJ_COMMIT: "commit",
+    pygit2.GIT_OBJ_TREE: "tree",
+    pygit2.GIT_OBJ_BLOB: "blob",
+    pygit2.GIT_OBJ_TAG: "tag",
+}
+TYPES = {name: type for type, name in TYPE_NAMES.items()}
+
+# Pack entry types beyond the regular object types
+OFS_DELTA = 6
+REF_DELTA = 7
+
+
+def read_varint(data, index):
+    """Little-endian base 128 integer, as in delta headers."""
+    value = shift = 0
+    while True:
+        byte = data[index]
+        index += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, index
+
+
+class Pack(object):
+    """A pack file and its version 2 index, to find where objects are."""
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.pack_path = index_path[: -len(".idx")] + ".pack"
+        with open(index_path, "rb") as f:
+            self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.index[:8] != b"\xfftOc\x00\x00\x00\x02":
+            self.index.close()
+            raise ValueError("unsupported pack index version")
+        self.fanout = struct.unpack_from(">256I", self.index, 8)
+        self.count = self.fanout[255]
+        self.names_at = 8 + 256 * 4
+        self.offsets_at = self.names_at + self.count * (20 + 4)
+        self.large_offsets_at = self.offsets_at + self.count * 4
+        self.pack = open(self.pack_path, "rb")
+
+    def close(self):
+        self.index.close()
+        self.pack.close()
+
+    def find_offset(self, raw_oid):
+        """Offset of the object in the pack file, None if not in this pack."""
+        first = raw_oid[0]
+        low = self.fanout[first - 1] if first else 0
+        high = self.fanout[first]
+        while low < high:
+            middle = (low + high) // 2
+            at = self.names_at + middle * 20
+            name = self.index[at : at + 20]
+            if name < raw_oid:
+                low = middle + 1
+            elif name > raw_oid:
+                high = middle
+            else:
+                (offset,) = struct.unpack_from(
+                    ">I", self.index, self.offsets_at + middle * 4
+                )
+                if offset & 0x80000000:
+                    at = self.large_offsets_at + (offset & 0x7FFFFFFF) * 8
+                    (offset,) = struct.unpack_from(">Q", self.index, at)
+                return offset
+        return None
+
+    def read_entry(self, offset):
+        """(type, size, base) of the pack entry, the base is set for deltas.
+
+        The size of a delta is the size of the final object, read in the delta header.
+        """
+        self.pack.seek(offset)
+        data = self.pack.read(64)
+        byte = data[0]
+        type = (byte >> 4) & 7
+        size = byte & 0x0F
+        shift = 4
+        index = 1
+        while byte & 0x80:
+            byte = data[index]
+            index += 1
+            size |= (byte & 0x7F) << shift
+            shift += 7
+
+        if type == OFS_DELTA:
+            byte = data[index]
+            index += 1
+            distance = byte & 0x7F
+            while byte & 0x80:
+                byte = data[index]
+                index += 1
+                distance = ((distance + 1) << 7) | (byte & 0x7F)
+            base = offset - distance
+        elif type == REF_DELTA:
+            base = data[index : index + 20]
+            index += 20
+        else:
+            return type, size, None
+
+        # The delta starts with the sizes of the base and final objects
+        self.pack.seek(offset + index)
+        delta_header = zlib.decompressobj().decompress(self.pack.read(256), 32)
+        _base_size, index = read_varint(delta_header, 0)
+        size, _index = read_varint(delta_header, index)
+        return type, size, base
+
+
+class ObjectDatabase(object):
+    """Object headers read from the loose objects and packs of a repository.
+
+    Objects in alternates or other backends fall back to a full read.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.objects = os.path.join(repo.path, "objects")
+        self.packs = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for pack in self.packs or ():
+            pack.close()
+        self.packs = None
+
+    def load_packs(self):
+        self.packs = []
+        pack_dir = os.path.join(self.objects, "pack")
+        try:
+            filenames = sorted(os.listdir(pack_dir))
+        except FileNotFoundError:
+            filenames = []
+        for filename in filenames:
+            if filename.endswith(".idx"):
+                try:
+                    self.packs.append(Pack(os.path.join(pack_dir, filename)))
+                except (OSError, ValueError):
+                    continue
+
+    def read_header(self, oid):
+        """Type and size of the object, without inflating its content."""
+        hex = str(oid)
+        header = self.read_loose_header(hex)
+        if header is None:
+            header = self.read_packed_header(bytes.fromhex(hex))
+        if header is None:
+            type, data = self.repo.odb.read(hex)
+            header = type, len(data)
+        return header
+
+    def read_loose_header(self, hex):
+        """Loose objects are zlib streams starting with "<type> <size>\\0"."""
+        path = os.path.join(self.objects, hex[:2], hex[2:])
+        try:
+            with open(path, "rb") as f:
+                decompressor = zlib.decompressobj()
+                header = b""
+                while b"\0" not in header:
+                    chunk = f.read(64)
+                    if not chunk:
+                        return None
+                    header += decompressor.decompress(chunk, 64 - len(header))
+        except (OSError, zlib.error):
+            return None
+        type_name, size = header.split(b"\0", 1)[0].split(b" ")
+        return TYPES[type_name.decode()], int(size)
+
+    def read_packed_header(self, raw_oid):
+        if self.packs is None:
+            self.load_packs()
+        for pack in self.packs:
+            offset = pack.find_offset(raw_oid)
+            if offset is None:
+                continue
+            try:
+                type, size, base = pack.read_entry(offset)
+                # The type of a delta is the type of its base object
+                while type == OFS_DELTA:
+                    type, _size, base = pack.read_entry(base)
+                if type == REF_DELTA:
+                    type, _size = self.read_header(base.hex())
+            except (IndexError, zlib.error):
+                return None
+            return type, size
+        return None
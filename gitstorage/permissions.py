@@ -0,0 +1,219 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tree permissions of a user loaded at once, to answer every check of a request in memory.
+"""
+
+from pathlib import Path
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+from . import cache
+from .conf import settings
+
+# Marks a node of the trie as granted, its value tells if descendants are granted too,
+# path segments are never None
+GRANTED = None
+
+
+def path_segments(path):
+    """Segments of a path, the root (".", "" or "/") has none."""
+    return Path(path).parts
+
+
+def materialized_path(parent_path, name):
+    """Path of a permission as stored, "." for the root."""
+    return str(Path(parent_path) / name)
+
+
+def ancestors(path):
+    """Materialized paths of the given path and of all its ancestors, up to the root."""
+    path = Path(path)
+    return [str(path)] + [str(parent) for parent in path.parents]
+
+
+class PermissionIndex(object):
+    """Trie of the paths of the tree permissions of a user.
+
+    Each node is a dictionary of its children by name, and GRANTED when there is a
+    permission on its own path, True if it is inherited by descendants. An index of
+    None paths allows everything (superuser).
+    """
+
+    def __init__(self, paths=()):
+        self.root = None if paths is None else {}
+        for parent_path, name, recursive in paths or ():
+            self.add(Path(parent_path) / name, recursive)
+
+    def __repr__(self):
+        return "<PermissionIndex {0}>".format(
+            "unrestricted" if self.root is None else len(self)
+        )
+
+    def __len__(self):
+        if self.root is None:
+            return 0
+        count = 0
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            for name, child in node.items():
+                if name is GRANTED:
+                    count += 1
+                else:
+                    nodes.append(child)
+        return count
+
+    @property
+    def is_unrestricted(self):
+        return self.root is None
+
+    def add(self, path, recursive=False):
+        node = self.root
+        for segment in path_segments(path):
+            node = node.setdefault(segment, {})
+        node[GRANTED] = node.get(GRANTED, False) or recursive
+
+    def walk(self, path):
+        """Node of the given path, None if no permission on or below it, and whether
+        the path inherits a permission from itself or an ancestor.
+        """
+        node = self.root
+        inherited = node.get(GRANTED, False)
+        for segment in path_segments(path):
+            node = node.get(segment)
+            if node is None:
+                return None, inherited
+            inherited = inherited or node.get(GRANTED, False)
+        return node, inherited
+
+    def is_allowed(self, path):
+        if self.root is None:
+            return True
+        node, inherited = self.walk(path)
+        return inherited or (node is not None and GRANTED in node)
+
+    def allowed_names(self, parent_path):
+        """Names of the trees allowed in the given tree, None for all."""
+        if self.root is None:
+            return None
+        node, inherited = self.walk(parent_path)
+        if inherited:
+            return None
+        if node is None:
+            return set()
+        return {
+            name
+            for name, child in node.items()
+            if name is not GRANTED and GRANTED in child
+        }
+
+    def allowed_paths(self, paths):
+        """The given paths the user is allowed on, breadcrumbs for instance."""
+        return [path for path in paths if self.is_allowed(path)]
+
+    def granted_paths(self):
+        """Materialized paths granted alone, and granted with their subtrees.
+
+        @return: (exact, recursive) sorted lists
+        """
+        exact, recursive = [], []
+        nodes = [(Path("."), self.root or {})]
+        while nodes:
+            path, node = nodes.pop()
+            for name, child in node.items():
+                if name is GRANTED:
+                    (recursive if child else exact).append(str(path))
+                else:
+                    nodes.append((path / name, child))
+        return sorted(exact), sorted(recursive)
+
+
+def user_key(user_id):
+    """All anonymous visitors share the same permissions."""
+    return "anonymous" if user_id is None else "user-{0}".format(user_id)
+
+
+class PermissionCache(object):
+    """Permission indexes of users shared across requests and processes.
+
+    Indexes are cached under the global version and the version of their user, bumping
+    a version is enough to invalidate them. Versions live in the shared cache so every
+    process sees a bump, no shared cache means no caching at all.
+    """
+
+    def __init__(self, alias, max_size):
+        self.alias = alias
+        self.indexes = cache.TieredCache("permissions", max_size, alias=alias)
+
+    @property
+    def shared(self):
+        if not self.alias:
+            return None
+        return caches[self.alias]
+
+    def version_key(self, user_id=None, all_users=False):
+        if all_users:
+            return "gitstorage:permissions:version"
+        return "gitstorage:permissions:version:{0}".format(user_key(user_id))
+
+    def get_versions(self, user_id):
+        """Global version and version of the user, in a single round trip."""
+        keys = [self.version_key(all_users=True), self.version_key(user_id)]
+        versions = self.shared.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # A counter evicted from the cache must not start again at a former
+                # version, start from the clock instead
+                self.shared.add(key, time.time_ns(), timeout=None)
+                versions[key] = self.shared.get(key)
+        return versions[keys[0]], versions[keys[1]]
+
+    def bump(self, user_id=None, all_users=False):
+        """Invalidate the indexes of the user, or of all users."""
+        shared = self.shared
+        if shared is None:
+            return
+        key = self.version_key(user_id, all_users)
+        try:
+            shared.incr(key)
+        except ValueError:
+            shared.set(key, time.time_ns(), timeout=None)
+
+    def get_index(self, user_id, load):
+        """The cached index of the user, or the one returned by calling load."""
+        if self.shared is None:
+            return load()
+        global_version, user_version = self.get_versions(user_id)
+        key = "{0}:{1}:{2}".format(user_key(user_id), global_version, user_version)
+        return self.indexes.get_or_set(key, load)
+
+
+permission_cache = PermissionCache(
+    settings.GITSTORAGE_PERMISSION_CACHE, settings.GITSTORAGE_PERMISSION_CACHE_SIZE
+)
+
+
+def invalidate(user_id=None, all_users=False):
+    """Bump the version of the user, or of all users, now and once committed.
+
+    Bumping only now, another process could cache the former permissions before the
+    transaction is committed.
+    """
+    permission_cache.bump(user_id, all_users)
+    transaction.on_commit(lambda: permission_cache.bump(user_id, all_users))
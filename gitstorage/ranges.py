@@ -0,0 +1,135 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+HTTP byte ranges (RFC 7233) to serve partial blob data.
+"""
+
+import re
+import uuid
+
+# More ranges than that are not a browser seeking but abuse, send everything once
+MAX_RANGES = 64
+
+RANGE_SPEC = re.compile(r"^(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(header, size):
+    """Byte ranges requested in the Range header, as (start, end) with end excluded.
+
+        @param header: Range header value, None if missing
+        @param size: length of the complete data
+        @return: list of ranges, None to send the complete data
+
+    Invalid headers and units other than bytes are ignored, as the RFC says.
+
+    Overlapping and adjacent ranges are merged, in ascending order. Ranges adding up
+    to more than the data are not a client resuming but abuse (RFC 7233, section
+    6.1), the complete data is sent once instead.
+
+    @raise RangeNotSatisfiable: none of the ranges overlaps the data
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+
+    ranges = []
+    for spec in specs.split(","):
+        match = RANGE_SPEC.match(spec.strip())
+        if not match:
+            return None
+        first, last = match.groups()
+        if first:
+            start, end = int(first), size
+            if last:
+                end = int(last) + 1
+                if end <= start:
+                    return None
+        elif last:
+            # Suffix range, the last bytes
+            if int(last) == 0:
+                continue
+            start, end = max(size - int(last), 0), size
+        else:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+    if sum(end - start for start, end in ranges) > size:
+        return None
+    if not ranges:
+        raise RangeNotSatisfiable()
+    return merge_ranges(ranges)
+
+
+def merge_ranges(ranges):
+    """Sort the ranges and coalesce the overlapping or adjacent ones."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def content_range(start, end, size):
+    return f"bytes {start}-{end - 1}/{size}"
+
+
+class MultipartByteranges(object):
+    """Body of a multipart/byteranges response, for several ranges.
+
+    The data of each range is read from `iter_range(start, end)` while sending.
+    """
+
+    def __init__(self, ranges, size, content_type, iter_range):
+        self.ranges = ranges
+        self.size = size
+        self.iter_range = iter_range
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/byteranges; boundary={self.boundary}"
+        self.headers = [
+            (
+                f"--{self.boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: {content_range(start, end, size)}\r\n"
+                "\r\n"
+            ).encode("ascii")
+            for start, end in ranges
+        ]
+        self.trailer = f"--{self.boundary}--\r\n".encode("ascii")
+
+    def __len__(self):
+        length = len(self.trailer)
+        for header, (start, end) in zip(self.headers, self.ranges):
+            length += len(header) + (end - start) + 2
+        return length
+
+    def __iter__(self):
+        for header, (start, end) in zip(self.headers, self.ranges):
+            yield header
+            yield from self.iter_range(start, end)
+            yield b"\r\n"
+        yield self.trailer
@@ -17,23 +17,186 @@
 Repository automatically opening the path configured in settings, with enhanced methods.
 """
 
+from collections import namedtuple
+import os
+from pathlib import PurePath
+import threading
+
 import pygit2
 
-from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
+from . import cache
+from . import odb
+from .conf import settings
+
+
+class TreeEntry(namedtuple("TreeEntry", ["name", "hex", "type", "filemode"])):
+    """Plain copy of a pygit2 tree entry, cheap to cache and to share between processes."""
+
+    __slots__ = ()
+
+    @classmethod
+    def from_object(cls, entry):
+        return cls(entry.name, entry.hex, entry.type, entry.filemode)
+
+    @property
+    def id(self):
+        return pygit2.Oid(hex=self.hex)
+
+
+def listing_size(listing):
+    trees, blobs = listing
+    return 1 + len(trees) + len(blobs)
+
+
+# A tree never changes for a given OID, its listing can be kept forever
+listing_cache = cache.TieredCache(
+    "listing",
+    settings.GITSTORAGE_LISTING_CACHE_SIZE,
+    alias=settings.GITSTORAGE_LISTING_CACHE,
+    sizeof=listing_size,
+)
+
+# Blob hex -> size
+size_cache = cache.TieredCache(
+    "size", settings.GITSTORAGE_SIZE_CACHE_SIZE, alias=settings.GITSTORAGE_SIZE_CACHE
+)
+
+# (root tree hex, path) -> (hex, type, filemode), or NOT_FOUND
+resolve_cache = cache.LRUCache(settings.GITSTORAGE_RESOLVE_CACHE_SIZE)
+NOT_FOUND = False
+
+
+def read_header(repo, oid):
+    """Type and size of an object, without inflating its content."""
+    odb_ = repo.odb
+    if hasattr(odb_, "read_header"):
+        return odb_.read_header(pygit2.Oid(hex=str(oid)))
+    return object_database(repo).read_header(oid)
+
+
+def read_sizes(repo, hexes):
+    """Sizes of the given blobs by OID, read in one batch and cached."""
+
+    def read(missing):
+        database = object_database(repo)
+        return {hex: database.read_header(hex)[1] for hex in missing}
+
+    return size_cache.get_or_set_many(hexes, read)
+
+
+def object_database(repo):
+    """Pack indexes of the repository, opened once and kept with the repository.
+
+    The pool reopens the repository when HEAD moves, so new packs are seen then.
+    """
+    database = getattr(repo, "_object_database", None)
+    if database is None:
+        database = odb.ObjectDatabase(repo)
+        repo._object_database = database
+    return database
+
+
+class LazyObject(object):
+    """Stand-in for a Git object known from its tree entry.
+
+    Type, OID and size are enough to check permissions and fill a Blob model,
+    the object content is only loaded (and a blob inflated) on first use.
+
+    It is not a pygit2 object for isinstance() or memoryview(), use load().
+    """
+
+    def __init__(self, repo, hex, type, name=None, obj=None):
+        self.repo = repo
+        self.hex = hex
+        self.type = type
+        self.name = name
+        self._obj = obj
+        self._size = None
+
+    def __repr__(self):
+        return "<LazyObject {0} {1}>".format(self.type_str, self.hex)
+
+    @property
+    def id(self):
+        return pygit2.Oid(hex=self.hex)
+
+    @property
+    def type_str(self):
+        return odb.TYPE_NAMES[self.type]
+
+    @property
+    def size(self):
+        if self._size is None:
+            if self._obj is not None:
+                self._size = self._obj.size if self.type == pygit2.GIT_OBJ_BLOB else 0
+            else:
+                _type, self._size = read_header(self.repo, self.hex)
+        return self._size
+
+    @property
+    def is_loaded(self):
+        return self._obj is not None
+
+    def load(self):
+        """The actual pygit2 object."""
+        if self._obj is None:
+            self._obj = self.repo[self.hex]
+        return self._obj
+
+    def __getattr__(self, name):
+        # Everything else requires the actual object
+        return getattr(self.load(), name)
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __contains__(self, key):
+        return key in self.load()
+
+
+def iter_blob(blob, start=0, end=None, chunk_size=65536):
+    """Yield the blob data between the given offsets, never copying more than a chunk.
+
+    The buffer is released when the iterator is exhausted or closed.
+    """
+    with memoryview(blob) as data:
+        if end is None:
+            end = len(data)
+        for offset in range(start, end, chunk_size):
+            yield bytes(data[offset : min(offset + chunk_size, end)])
+
+
+def get_repository_path():
+    try:
+        return settings.GITSTORAGE_REPOSITORY
+    except AttributeError:
+        raise ImproperlyConfigured("GITSTORAGE_REPOSITORY is required")
+
 
 class Repository(pygit2.Repository):
     def __init__(self, *args, **kwargs):
-        try:
-            path = settings.GITSTORAGE_REPOSITORY
-        except AttributeError:
-            raise ImproperlyConfigured("GITSTORAGE_REPOSITORY is required")
-        super().__init__(path, *args, **kwargs)
+        super().__init__(get_repository_path(), *args, **kwargs)
         # Not strictly required but sane, gitstorage is not designed for checkouts
         # assert self.is_bare
-        # Always load the index
-        self.index.read_tree(self.tree.id)
+        # The index is only loaded on first use, reading never needs it
+        self._index_loaded = False
+
+    @property
+    def index(self):
+        """The index, loaded from the head tree on first access.
+
+        Loading walks the whole tree, prefer write_session() to stage changes.
+        """
+        index = super().index
+        if not self._index_loaded:
+            index.read_tree(self.tree.id)
+            self._index_loaded = True
+        return index
 
     @property
     def commit(self):
@@ -45,32 +208,192 @@ class Repository(pygit2.Repository):
         """shortcut to the head tree"""
         return self.head.peel(pygit2.GIT_OBJ_TREE)
 
+    def snapshot(self, commit_id=None):
+        """Pin a view of the repository to the given commit, the head one by default."""
+        return Snapshot(self, commit_id)
+
+    def open(self, path):
+        """High-level object retriever, see Snapshot.open."""
+        return self.snapshot().open(path)
+
+    def listdir(self, path):
+        """List the contents of the given path, see Snapshot.listdir."""
+        return self.snapshot().listdir(path)
+
+    def read_sizes(self, hexes):
+        """Sizes of the given blobs by OID, see read_sizes."""
+        return read_sizes(self, hexes)
+
+    def write_session(self):
+        """Start staging changes on top of the current head commit."""
+        return WriteSession(self)
+
+
+class Snapshot(object):
+    """The repository as of a single commit.
+
+    References are resolved and the tree peeled only once, so a request keeps a
+    consistent view even if a push moves HEAD in the meantime. Other attributes are
+    the ones of the repository, views can keep using self.repo as a Repository.
+    """
+
+    def __init__(self, repo, commit_id=None):
+        self.repo = repo
+        if commit_id is None:
+            self.commit = repo.head.peel(pygit2.GIT_OBJ_COMMIT)
+        else:
+            self.commit = repo[commit_id].peel(pygit2.GIT_OBJ_COMMIT)
+        self.tree = self.commit.tree
+
+    def __getitem__(self, oid):
+        return self.repo[oid]
+
+    def __getattr__(self, name):
+        # The rest of the Repository API, not pinned: head, walk, write_session...
+        if name == "repo":
+            raise AttributeError(name)
+        return getattr(self.repo, name)
+
     def open(self, path):
         """High-level object retriever.
 
         @param path: object path, relative to the repository root
+        @return: LazyObject, only loaded when its content is needed
         """
 
         # Repository root
         if str(path) in ("", ".", "/"):
-            return self.tree
+            return LazyObject(
+                self.repo, self.tree.hex, pygit2.GIT_OBJ_TREE, obj=self.tree
+            )
 
-        tree_entry = self.tree[str(path)]
-        return self[tree_entry.id]
+        object_id, type, _filemode = self.resolve(path)
+        return LazyObject(self.repo, object_id, type, name=PurePath(path).name)
+
+    def resolve(self, path):
+        """Find the object at the given path without walking the tree again if we can.
+
+        @param path: object path, relative to the repository root
+        @return: (hex, type, filemode) of the object
+        @raise KeyError: no such path, not found paths are cached too
+        """
+        key = (self.tree.hex, str(path))
+        resolved = resolve_cache.get(key)
+        if resolved is None:
+            try:
+                entry = self.tree[str(path)]
+            except KeyError:
+                resolved = NOT_FOUND
+            else:
+                resolved = (entry.hex, entry.type, entry.filemode)
+            resolve_cache.set(key, resolved)
+        if resolved is NOT_FOUND:
+            raise KeyError(str(path))
+        return resolved
 
     def listdir(self, path):
         """List the contents of the given path.
 
             @param: path: tree path, relative to the repository root
-            @return: ([], []) trees and blobs
+            @return: ((), ()) trees and blobs, sorted by name
 
         Contrary to a filesystem listdir, we expose tree entries, and keep the notion of blobs and trees.
+
+        Listings are cached by tree OID, shared by every path and commit containing the same tree.
         """
         tree = self.open(path)
-        trees, blobs = [], []
-        for entry in tree:
-            if entry.type == pygit2.GIT_OBJ_BLOB:
-                blobs.append(entry)
-            elif entry.type == pygit2.GIT_OBJ_TREE:
-                trees.append(entry)
-        return trees, blobs
+        return listing_cache.get_or_set(tree.hex, lambda: partition(tree.load()))
+
+    def read_sizes(self, hexes):
+        return self.repo.read_sizes(hexes)
+
+
+def partition(tree):
+    """Split tree entries into trees and blobs (submodules are ignored)."""
+    trees, blobs = [], []
+    for entry in tree:
+        if entry.type == pygit2.GIT_OBJ_BLOB:
+            blobs.append(TreeEntry.from_object(entry))
+        elif entry.type == pygit2.GIT_OBJ_TREE:
+            trees.append(TreeEntry.from_object(entry))
+    trees.sort()
+    blobs.sort()
+    return tuple(trees), tuple(blobs)
+
+
+class WriteSession(object):
+    """In-memory index loaded from the head tree, to build the next commit.
+
+    Building the index walks the whole tree, only pay for it when writing.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.parent = repo.head.target
+        self.index = pygit2.Index()
+        self.index.read_tree(repo[self.parent].tree)
+
+    def add(self, path, data, filemode=pygit2.GIT_FILEMODE_BLOB):
+        """Store the data as a blob at the given path, relative to the repository root."""
+        oid = self.repo.create_blob(data)
+        self.index.add(pygit2.IndexEntry(str(path), oid, filemode))
+        return oid
+
+    def remove(self, path):
+        self.index.remove(str(path))
+
+    def commit(self, message, author=None, committer=None):
+        """Write the staged tree and move HEAD to the new commit.
+
+        Fails if HEAD moved since the session started, instead of losing changes.
+        """
+        tree = self.index.write_tree(self.repo)
+        author = author or self.repo.default_signature
+        committer = committer or author
+        return self.repo.create_commit(
+            "HEAD", author, committer, message, tree, [self.parent]
+        )
+
+
+class RepositoryPool(threading.local):
+    """Keep one open repository per thread and reuse it across requests.
+
+    Opening a repository rebuilds the libgit2 object cache and memory-mapped pack
+    windows, a fixed cost we don't want to pay on every request.
+
+    The handle is reopened when HEAD moves (dropping objects cached for the old
+    commit), when the configured path changes, or in a forked child process (libgit2
+    handles must not be shared across a fork).
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.repo = None
+        self.path = None
+        self.pid = None
+        self.head = None
+
+    def is_stale(self, path):
+        if self.repo is None:
+            return True
+        if self.pid != os.getpid() or self.path != path:
+            return True
+        try:
+            return self.repo.head.target != self.head
+        except pygit2.GitError:
+            return True
+
+    def get(self):
+        """The repository for the current thread, opened on first use."""
+        path = get_repository_path()
+        if self.is_stale(path):
+            self.repo = Repository()
+            self.path = path
+            self.pid = os.getpid()
+            self.head = self.repo.head.target
+        return self.repo
+
+
+pool = RepositoryPool()
@@ -0,0 +1,83 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Search blobs and trees by name in the path metadata, and text blobs by content.
+"""
+
+import re
+import unicodedata
+
+from .conf import settings
+
+# Names starting with the query, or containing it
+PREFIX = "prefix"
+SUBSTRING = "substring"
+# Text blobs containing every word of the query
+CONTENT = "content"
+MODES = (PREFIX, SUBSTRING, CONTENT)
+
+# Above any character, ends the range of names starting with a prefix
+MAX_CHAR = "\U0010ffff"
+
+# Names are indexed by their substrings of this length, shorter queries match prefixes
+TRIGRAM_LENGTH = 3
+
+# Words shorter are too common, longer are not words
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+WORD_RE = re.compile(r"\w+")
+
+
+def fold(text):
+    """Case and accent insensitive form of a name: "Dépôt.TXT" -> "depot.txt"."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(
+        char for char in decomposed if not unicodedata.combining(char)
+    ).casefold()
+
+
+def trigrams(folded_name):
+    """Distinct substrings of three characters of a folded name, as indexed."""
+    return {
+        folded_name[i : i + TRIGRAM_LENGTH]
+        for i in range(len(folded_name) - TRIGRAM_LENGTH + 1)
+    }
+
+
+def terms(text):
+    """Distinct folded words of a text, as indexed."""
+    return {
+        word
+        for word in WORD_RE.findall(fold(text))
+        if MIN_TERM_LENGTH <= len(word) <= MAX_TERM_LENGTH
+    }
+
+
+def is_indexable(mimetype, size):
+    """Whether the content of a blob is indexed, guessing from its name and size."""
+    if size is None or size > settings.GITSTORAGE_CONTENT_INDEX_MAX_SIZE:
+        return False
+    return any(
+        mimetype.startswith(prefix)
+        for prefix in settings.GITSTORAGE_CONTENT_INDEX_MIMETYPES
+    )
+
+
+def decode(data):
+    """Text of a blob, None for binary content."""
+    if b"\0" in data:
+        return None
+    return data.decode("utf-8", errors="replace")
@@ -0,0 +1,195 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Content-addressed spool of blob data on disk, for the Web server to send the files itself.
+"""
+
+import fcntl
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+
+from . import repository
+from .conf import settings
+
+
+class BlobSpool(object):
+    """Files of blob data, named after their OID like loose Git objects: "ab/cdef...".
+
+    Each blob is written at most once: writes are atomic (renamed into place) and
+    workers filling the same OID wait for each other on a lock file.
+
+    The modification time is updated on every use, the least recently used files
+    are evicted when a new file makes the spool grow over `max_size` bytes. Blobs larger than the
+    whole spool are not spooled.
+    """
+
+    # Files evicted by other workers between filling and opening, before giving up
+    open_attempts = 3
+
+    def __init__(self, root, max_size=None):
+        self.root = os.fspath(root)
+        self.max_size = max_size
+
+    def path(self, hex):
+        return os.path.join(self.root, hex[:2], hex[2:])
+
+    def touch(self, path):
+        """Mark the file as recently used, if it exists."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def fits(self, size):
+        """Whether a blob of the given size may be spooled."""
+        return self.max_size is None or size <= self.max_size
+
+    def fill(self, git_obj, evict=True):
+        """Path to the spooled data of the blob, written if missing.
+
+        The file may be evicted by another worker at any time, open it with
+        open_file to read it.
+
+        @param git_obj: blob or LazyObject, only loaded if not spooled yet
+        @param evict: make room for a new file, never evicting it
+        """
+        path, written = self._fill(git_obj)
+        if evict and written:
+            self.evict(keep=path)
+        return path
+
+    def _fill(self, git_obj):
+        """Path to the spooled data of the blob, and whether it was just written."""
+        path = self.path(git_obj.hex)
+        if self.touch(path):
+            return path, False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Removed with the file on eviction: a worker still waiting on the old lock
+        # may then write the blob again, harmless as writes are atomic.
+        with open(path + ".lock", "wb") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Another worker may have filled it while we were waiting
+                if self.touch(path):
+                    return path, False
+                self.write(path, git_obj)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return path, True
+
+    def open_file(self, git_obj):
+        """The spooled data of the blob, opened before evicting anything.
+
+        Once opened, the data stays readable even if the file is evicted.
+        """
+        for attempt in range(self.open_attempts):
+            path, written = self._fill(git_obj)
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                # Evicted by another worker in the meantime
+                if attempt == self.open_attempts - 1:
+                    raise
+                continue
+            if written:
+                self.evict(keep=path)
+            return f
+
+    def write(self, path, git_obj):
+        blob = git_obj.load() if hasattr(git_obj, "load") else git_obj
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in repository.iter_blob(
+                    blob, chunk_size=settings.GITSTORAGE_DOWNLOAD_CHUNK_SIZE
+                ):
+                    f.write(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def files(self):
+        """(modification time, size, path) of every spooled file."""
+        for dirpath, _dirnames, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith(".") or filename.endswith(".lock"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def evict(self, keep=None):
+        """Remove the least recently used files until the spool fits in its maximum size.
+
+        Only called after writing a new file, as it stats the whole spool.
+
+        @param keep: path of a file never removed, the one just filled
+        """
+        if self.max_size is None:
+            return
+        files = sorted(self.files())
+        total = sum(size for _mtime, size, _path in files)
+        for _mtime, size, path in files:
+            if total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            for filename in (path, path + ".lock"):
+                try:
+                    os.unlink(filename)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+def iter_file(file, start, end, chunk_size=65536):
+    """Yield the file data between the given offsets, a chunk at a time.
+
+    @param file: path, or binary file closed once exhausted
+    """
+    if isinstance(file, (str, bytes, os.PathLike)):
+        file = open(file, "rb")
+    with file as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+_spools = {}
+
+
+def get_spool():
+    """The spool configured in the settings."""
+    root = settings.GITSTORAGE_SPOOL_ROOT
+    if not root:
+        raise ImproperlyConfigured("GITSTORAGE_SPOOL_ROOT is required to spool blobs")
+    key = (os.fspath(root), settings.GITSTORAGE_SPOOL_MAX_SIZE)
+    if key not in _spools:
+        _spools[key] = BlobSpool(*key)
+    return _spools[key]
@@ -0,0 +1,181 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Changes between two commits, to update the state derived from the repository on push.
+
+Subtrees with the same OID on both sides are skipped, so the diff costs as much as
+the change, not as the repository.
+"""
+
+from collections import defaultdict, namedtuple
+from pathlib import PurePath
+
+import pygit2
+
+from django.db import transaction
+
+from . import signals
+
+ADDED = "added"
+MODIFIED = "modified"
+DELETED = "deleted"
+RENAMED = "renamed"
+
+# An OID of zeros stands for no commit, when a branch is created or deleted
+NULL_HEX = "0" * 40
+
+
+class Change(
+    namedtuple(
+        "Change", ["status", "type", "old_path", "new_path", "old_hex", "new_hex"]
+    )
+):
+    """A blob or tree added, modified, deleted or renamed (moved unchanged).
+
+    The path and OID of the side that doesn't exist are None. A modified tree is
+    reported before the changes inside it.
+    """
+
+    __slots__ = ()
+
+    @property
+    def path(self):
+        """The new path, the old one if deleted."""
+        return self.old_path if self.new_path is None else self.new_path
+
+
+def tree_entries(repo, tree_hex):
+    """Blobs and trees of a tree, as (type, hex) by name."""
+    if tree_hex is None:
+        return {}
+    return {
+        entry.name: (entry.type, entry.hex)
+        for entry in repo[tree_hex]
+        if entry.type in (pygit2.GIT_OBJ_BLOB, pygit2.GIT_OBJ_TREE)
+    }
+
+
+def walk(repo, tree_hex, path):
+    """(path, type, hex) of every blob and tree below the given tree, parents first."""
+    for name, (type, hex) in sorted(tree_entries(repo, tree_hex).items()):
+        yield path / name, type, hex
+        if type == pygit2.GIT_OBJ_TREE:
+            yield from walk(repo, hex, path / name)
+
+
+def diff_trees(repo, old_hex, new_hex, path=PurePath()):
+    """Blobs and trees added, modified or deleted between two trees, parents first.
+
+    Renames are reported as deleted and added, see detect_renames.
+    """
+    if old_hex == new_hex:
+        return
+    old_entries = tree_entries(repo, old_hex)
+    new_entries = tree_entries(repo, new_hex)
+    for name in sorted(old_entries.keys() | new_entries.keys()):
+        old = old_entries.get(name)
+        new = new_entries.get(name)
+        if old == new:
+            continue
+        entry_path = path / name
+
+        if old and new and old[0] == new[0]:
+            yield Change(MODIFIED, old[0], entry_path, entry_path, old[1], new[1])
+            if old[0] == pygit2.GIT_OBJ_TREE:
+                yield from diff_trees(repo, old[1], new[1], entry_path)
+            continue
+
+        # A blob replaced by a tree, or the other way around, is deleted then added
+        if old:
+            yield Change(DELETED, old[0], entry_path, None, old[1], None)
+            if old[0] == pygit2.GIT_OBJ_TREE:
+                for sub_path, type, hex in walk(repo, old[1], entry_path):
+                    yield Change(DELETED, type, sub_path, None, hex, None)
+        if new:
+            yield Change(ADDED, new[0], None, entry_path, None, new[1])
+            if new[0] == pygit2.GIT_OBJ_TREE:
+                for sub_path, type, hex in walk(repo, new[1], entry_path):
+                    yield Change(ADDED, type, None, sub_path, None, hex)
+
+
+def detect_renames(changes):
+    """Pair entries deleted and added with the same type and OID as renamed.
+
+    Moved unchanged, a blob or a whole tree keeps its OID. Among identical entries, the
+    one with the same name is preferred. The rename takes the place of the addition.
+    """
+    added = defaultdict(list)
+    for index, change in enumerate(changes):
+        if change.status == ADDED:
+            added[(change.type, change.new_hex)].append(index)
+
+    renamed = {}
+    deleted = set()
+    for index, change in enumerate(changes):
+        if change.status != DELETED:
+            continue
+        candidates = added.get((change.type, change.old_hex))
+        if not candidates:
+            continue
+        match = candidates[0]
+        for candidate in candidates:
+            if changes[candidate].new_path.name == change.old_path.name:
+                match = candidate
+                break
+        candidates.remove(match)
+        renamed[match] = change._replace(
+            status=RENAMED,
+            new_path=changes[match].new_path,
+            new_hex=changes[match].new_hex,
+        )
+        deleted.add(index)
+
+    return [
+        renamed.get(index, change)
+        for index, change in enumerate(changes)
+        if index not in deleted
+    ]
+
+
+def tree_hex(repo, commit_hex):
+    if commit_hex in (None, NULL_HEX):
+        return None
+    return repo[commit_hex].peel(pygit2.Tree).hex
+
+
+def diff_commits(repo, old_commit, new_commit):
+    """Changes between two commits, either may be NULL_HEX."""
+    changes = list(
+        diff_trees(repo, tree_hex(repo, old_commit), tree_hex(repo, new_commit))
+    )
+    return detect_renames(changes)
+
+
+def sync(repo, old_commit, new_commit, refname=None, batch_size=1000):
+    """Send the changes between the two commits, in batches, one transaction each.
+
+    @return: list of Change
+    """
+    changes = diff_commits(repo, old_commit, new_commit)
+    for start in range(0, len(changes), batch_size):
+        with transaction.atomic():
+            signals.changes_synced.send(
+                sender=repo.__class__,
+                repo=repo,
+                refname=refname,
+                changes=changes[start : start + batch_size],
+            )
+    return changes
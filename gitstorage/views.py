@@ -13,15 +13,26 @@
 #    You should have received a copy of the GNU General Public License
 #    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
 
+import bisect
 from functools import update_wrapper
+import hashlib
+import heapq
 import logging
 import operator
+import os
 from pathlib import Path
 import unicodedata
 import urllib.parse
 
-from django.core.exceptions import PermissionDenied
-from django.http.response import Http404, HttpResponse
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.http.response import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response
 from django.utils.decorators import classonlymethod
 from django.views import generic as generic_views
 
@@ -29,11 +40,18 @@ import pygit2
 
 from . import forms
 from . import models
+from . import odb
+from . import ranges
 from . import repository
+from . import search
+from . import spool
+from .conf import settings
 
 
 logger = logging.getLogger(__name__)
 
+SORT_BY_NAME = operator.attrgetter("name")
+
 
 class ObjectViewMixin(object):
     """API common to all Git object views.
@@ -42,11 +60,21 @@ class ObjectViewMixin(object):
     """
 
     allowed_types = ()
+    # Order of blobs in listings, applied to models.ListingEntry
+    sort_key = SORT_BY_NAME
+    sort_reverse = False
+    # Read blob sizes for listings, only their object headers are read
+    list_sizes = True
     # Attributes available when rendering the view
-    repo = None
+    repo = None  # Snapshot of the repository, consistent for the whole request
     path = None
     git_obj = None
     object = None
+    # Computed once per request
+    permissions = None
+    # Computed once per request, by path
+    entries = None
+    listings = None
 
     def check_object_type(self):
         """Some views only apply to blobs, other to trees."""
@@ -62,32 +90,79 @@ class ObjectViewMixin(object):
         """Abstract, no implicit permission."""
         raise NotImplementedError()
 
+    def get_permissions(self):
+        """Tree permissions of the user, queried once per request."""
+        if self.permissions is None:
+            self.permissions = models.TreePermission.objects.index(self.request.user)
+        return self.permissions
+
+    def get_allowed_names(self, path: Path):
+        """Names of the trees the user may browse under the given path, None for all."""
+        return self.get_permissions().allowed_names(path)
+
+    def get_entries(self, path: Path):
+        """Tree entries of the given tree visible to the user, sorted by name.
+
+        Counting or paginating them doesn't need to build the listing entries.
+        """
+        if self.entries is None:
+            self.entries = {}
+        path = Path(path)
+        if path not in self.entries:
+            allowed_names = self.get_allowed_names(path)
+            tree_entries, blob_entries = self.repo.listdir(path)
+            trees = [
+                entry
+                for entry in tree_entries
+                # Hide hidden files
+                if entry.name[0] != "."
+                and (allowed_names is None or entry.name in allowed_names)
+            ]
+            # No check on allowed_names, all blobs are readable if their parent tree is
+            blobs = [entry for entry in blob_entries if entry.name[0] != "."]
+            self.entries[path] = trees, blobs
+        return self.entries[path]
+
+    def make_entries(self, path: Path, entries):
+        """Listing entries of the given tree entries, with blob sizes read in one batch."""
+        sizes = {}
+        if self.list_sizes:
+            sizes = self.repo.read_sizes(
+                [entry.hex for entry in entries if entry.type == pygit2.GIT_OBJ_BLOB]
+            )
+        return [
+            models.ListingEntry(
+                entry.name, path, entry.hex, entry.type, sizes.get(entry.hex)
+            )
+            for entry in entries
+        ]
+
+    def get_listing(self, path: Path):
+        """Trees and blobs of the given tree visible to the user, sorted.
+
+        Entries are partitioned, filtered and sorted in a single pass, once per path
+        and request, the result is shared by the root trees, the trees and the blobs.
+        """
+        if self.listings is None:
+            self.listings = {}
+        path = Path(path)
+        if path not in self.listings:
+            tree_entries, blob_entries = self.get_entries(path)
+            trees = self.make_entries(path, tree_entries)
+            blobs = self.make_entries(path, blob_entries)
+            # Linear when already sorted by name
+            blobs.sort(key=self.sort_key, reverse=self.sort_reverse)
+            self.listings[path] = trees, blobs
+        return self.listings[path]
+
     def filter_trees(self, path: Path):
         """
         Filter tree entries of the given tree by permission allowance.
 
         Should be in TreeViewMixin buy we want the root trees on every page.
         """
-        allowed_names = models.TreePermission.objects.allowed_names(
-            self.request.user, path
-        )
-        filtered = []
-
-        trees, _blobs = self.repo.listdir(path)
-        for entry in trees:
-            # Hide hidden files
-            if entry.name[0] == ".":
-                continue
-            if allowed_names is not None and entry.name not in allowed_names:
-                continue
-            filtered.append(
-                {
-                    "name": entry.name,
-                    "path": str(path / entry.name),
-                    "tree": models.Tree(id=entry.hex),
-                }
-            )
-        return sorted(filtered, key=operator.itemgetter("name"))
+        trees, _blobs = self.get_listing(path)
+        return trees
 
     def load_object(self):
         """Each Git object type has its own Django model.
@@ -101,23 +176,30 @@ class ObjectViewMixin(object):
         elif self.git_obj.type == pygit2.GIT_OBJ_TREE:
             self.object = models.Tree(pk=self.git_obj.hex)
 
-    def get_context_data(self, **kwargs):
-        """Context variables for any type of Git object and on every page."""
-        context = super().get_context_data(**kwargs)
-
-        root_trees = self.filter_trees(Path(""))
-
+    def get_breadcrumbs(self):
+        """Paths from the first tree under the root down to the current path."""
         breadcrumbs = []
         path = self.path
         while path != Path("."):
             breadcrumbs.insert(0, path)
             path = path.parent
+        return breadcrumbs
+
+    def get_context_data(self, **kwargs):
+        """Context variables for any type of Git object and on every page."""
+        context = super().get_context_data(**kwargs)
+
+        root_trees = self.filter_trees(Path(""))
+        breadcrumbs = self.get_breadcrumbs()
 
         context["path"] = self.path
         context["git_obj"] = self.git_obj
         context["object"] = self.object
         context["root_trees"] = root_trees
         context["breadcrumbs"] = breadcrumbs
+        context["allowed_breadcrumbs"] = self.get_permissions().allowed_paths(
+            breadcrumbs
+        )
         return context
 
     def dispatch(self, request, path, repo=None, git_obj=None, *args, **kwargs):
@@ -138,7 +220,7 @@ class ObjectViewMixin(object):
             raise PermissionDenied()
 
         if not repo:
-            repo = repository.Repository()
+            repo = repository.pool.get().snapshot()
         self.repo = repo
 
         if not git_obj:
@@ -154,7 +236,32 @@ class ObjectViewMixin(object):
         logger.debug("calling check_permissions %s", self.check_permissions)
         self.check_permissions()
 
-        return super().dispatch(request, path, *args, **kwargs)
+        if request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, path, *args, **kwargs)
+
+        # Answer conditional requests before building the response
+        etag = self.get_etag()
+        response = None
+        if etag:
+            response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().dispatch(request, path, *args, **kwargs)
+        if etag and (200 <= response.status_code < 300 or response.status_code == 304):
+            response["ETag"] = etag
+            cache_control = self.get_cache_control()
+            if cache_control and "Cache-Control" not in response:
+                response["Cache-Control"] = cache_control
+        return response
+
+    def get_etag(self):
+        """Validator of the response to a GET request, None to disable conditional requests.
+
+        Permissions are already checked when it is called.
+        """
+        return None
+
+    def get_cache_control(self):
+        return None
 
 
 class BlobViewMixin(ObjectViewMixin):
@@ -166,9 +273,7 @@ class BlobViewMixin(ObjectViewMixin):
     allowed_types = (pygit2.GIT_OBJ_BLOB,)
 
     def check_permissions(self):
-        if not models.TreePermission.objects.is_allowed(
-            self.request.user, self.path.parent
-        ):
+        if not self.get_permissions().is_allowed(self.path.parent):
             raise PermissionDenied()
 
 
@@ -176,8 +281,13 @@ class DownloadViewMixin(BlobViewMixin):
     """Download blob data from the storage once permissions are cleared."""
 
     attachment = True
+    # How the blob data is sent, see the "serve_*" methods, the setting by default
+    download_backend = None
 
-    def get(self, request, *args, **kwargs):
+    def get_download_backend(self):
+        return self.download_backend or settings.GITSTORAGE_DOWNLOAD_BACKEND
+
+    def get_content_disposition(self):
         disposition = ["attachment" if self.attachment else "inline"]
 
         # Clean up filesystem idiosyncrasies: "de\u0301po\u0302t.jpg" -> "dépôt.jpg"
@@ -190,16 +300,126 @@ class DownloadViewMixin(BlobViewMixin):
             quoted_filename = urllib.parse.quote(attachment_filename)
             disposition.append(f"filename*=UTF-8''{quoted_filename}")
 
-        # The context manager will "release" the buffer on exit
-        with memoryview(self.git_obj) as m:
-            response = HttpResponse(m)
+        return "; ".join(disposition)
+
+    def serve_memory(self):
+        """The whole blob data copied in the response."""
+        response = HttpResponse(self.git_obj.data)
+        response["Content-Length"] = self.object.size
+        return response
+
+    def serve_stream(self):
+        """The blob data copied in bounded chunks while the response is sent."""
+        response = StreamingHttpResponse(self.iter_range(0, self.object.size))
+        response["Content-Length"] = self.object.size
+        return response
+
+    def serve_file(self):
+        """Spool the blob data, the WSGI server sends the file (wsgi.file_wrapper, sendfile).
+
+        Blobs larger than the spool are streamed.
+        """
+        blob_spool = spool.get_spool()
+        if not blob_spool.fits(self.object.size):
+            return self.serve_stream()
+        return FileResponse(blob_spool.open_file(self.git_obj))
+
+    def serve_offload(self):
+        """Spool the blob data, the Web server sends the file, ranges included.
+
+        Blobs larger than the spool are streamed.
+        """
+        blob_spool = spool.get_spool()
+        if not blob_spool.fits(self.object.size):
+            return self.serve_stream()
+        path = blob_spool.fill(self.git_obj)
+        header = settings.GITSTORAGE_OFFLOAD_HEADER
+        response = HttpResponse()
+        if header.lower() == "x-sendfile":
+            response[header] = path
+        else:
+            relative_path = os.path.relpath(path, settings.GITSTORAGE_SPOOL_ROOT)
+            response[header] = settings.GITSTORAGE_OFFLOAD_URL + relative_path
+        return response
+
+    def iter_range(self, start, end):
+        chunk_size = settings.GITSTORAGE_DOWNLOAD_CHUNK_SIZE
+        if self.get_download_backend() == "file":
+            blob_spool = spool.get_spool()
+            if blob_spool.fits(self.object.size):
+                f = blob_spool.open_file(self.git_obj)
+                return spool.iter_file(f, start, end, chunk_size=chunk_size)
+        return repository.iter_blob(
+            self.git_obj.load(), start, end, chunk_size=chunk_size
+        )
+
+    def get_etag(self):
+        # The OID is a strong validator, nothing to load
+        return f'"{self.git_obj.hex}"'
+
+    def get_cache_control(self):
+        return settings.GITSTORAGE_BLOB_CACHE_CONTROL
+
+    def if_range_matches(self, validator):
+        """Whether the If-Range validator still identifies the blob."""
+        # Strong comparison, dates are not supported
+        return validator == self.get_etag()
+
+    def get_ranges(self):
+        """Byte ranges to serve, None for the whole blob."""
+        if_range = self.request.META.get("HTTP_IF_RANGE")
+        if if_range is not None and not self.if_range_matches(if_range):
+            return None
+        return ranges.parse_range_header(
+            self.request.META.get("HTTP_RANGE"), self.object.size
+        )
+
+    def serve_ranges(self, byte_ranges):
+        """Partial content, only the requested byte ranges are read."""
+        size = self.object.size
+        if len(byte_ranges) == 1:
+            start, end = byte_ranges[0]
+            response = StreamingHttpResponse(self.iter_range(start, end), status=206)
+            response["Content-Type"] = self.object.mimetype
+            response["Content-Range"] = ranges.content_range(start, end, size)
+            response["Content-Length"] = end - start
+        else:
+            body = ranges.MultipartByteranges(
+                byte_ranges, size, self.object.mimetype, self.iter_range
+            )
+            response = StreamingHttpResponse(body, status=206)
+            response["Content-Type"] = body.content_type
+            response["Content-Length"] = len(body)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        backend = self.get_download_backend()
+        try:
+            serve = getattr(self, f"serve_{backend}")
+        except AttributeError:
+            raise ImproperlyConfigured(f"Unknown download backend {backend!r}")
+
+        byte_ranges = None
+        # The Web server handles ranges of offloaded files
+        if backend != "offload":
+            try:
+                byte_ranges = self.get_ranges()
+            except ranges.RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{self.object.size}"
+                return response
+
+        if byte_ranges:
+            response = self.serve_ranges(byte_ranges)
+        else:
+            response = serve()
             response["Content-Type"] = self.object.mimetype
-            if self.object.encoding:
-                response["Content-Encoding"] = self.object.encoding
-            response["Content-Disposition"] = "; ".join(disposition)
-            # Content-Length comes from the memory object length
 
-            return response
+        if self.object.encoding:
+            response["Content-Encoding"] = self.object.encoding
+        response["Content-Disposition"] = self.get_content_disposition()
+        response["Accept-Ranges"] = "bytes"
+        return response
 
 
 class InlineViewMixin(DownloadViewMixin):
@@ -215,46 +435,138 @@ class TreeViewMixin(ObjectViewMixin):
     """
 
     allowed_types = (pygit2.GIT_OBJ_TREE,)
-    sort_key = operator.itemgetter("name")
-    sort_reverse = False
+    # Answer conditional requests from the tree OID and the user permissions, only if
+    # the page depends on nothing else: messages, CSRF tokens, other context...
+    conditional = False
+    # Number of trees and of blobs by page, None to list them all
+    paginate_by = None
+    # Query parameters of the cursors, the name of the last entry of the previous page
+    trees_cursor_kwarg = "trees_after"
+    blobs_cursor_kwarg = "blobs_after"
 
     def check_permissions(self):
-        if not models.TreePermission.objects.is_allowed(self.request.user, self.path):
+        if not self.get_permissions().is_allowed(self.path):
             raise PermissionDenied()
 
-    def filter_blobs(self):
-        _trees, blobs = self.repo.listdir(self.path)
+    def get_etag(self):
+        """Weak validator of the tree page, as seen by this user.
 
-        objects = []
-        for entry in blobs:
-            # Hide hidden files
-            if entry.name[0] == ".":
-                continue
-            # No check on allowed_names, all blobs are readable if their parent tree is
-            objects.append(
-                {
-                    "name": entry.name,
-                    "path": str(self.path / entry.name),
-                    "blob": models.Blob(pk=entry.hex, name=entry.name),  # No size!
-                }
-            )
+        The page also lists the root trees, so the root tree is part of it, and links
+        the breadcrumbs the user is allowed on.
+        """
+        if not self.conditional:
+            return None
+        user = self.request.user
+        state = [self.git_obj.hex, self.repo.tree.hex, user.pk, user.is_superuser]
+        for path in (self.path, Path("")):
+            allowed_names = self.get_allowed_names(path)
+            state.append(None if allowed_names is None else sorted(allowed_names))
+        state.append(self.get_permissions().allowed_paths(self.get_breadcrumbs()))
+        digest = hashlib.sha1(repr(state).encode()).hexdigest()
+        return f'W/"{self.git_obj.hex}-{digest}"'
+
+    def get_cache_control(self):
+        return settings.GITSTORAGE_TREE_CACHE_CONTROL
+
+    def get_cursor(self, kwarg):
+        return self.request.GET.get(kwarg) or None
+
+    def paginate(self, path: Path, entries, after=None, key=None, reverse=False):
+        """Page of the listing entries following the entry named `after`.
+
+        Entries come sorted by name, the page is sliced from them when listed by name.
+        Otherwise it is selected with a heap, ordered by key then name, without
+        sorting every entry. Cursors are names so deep pages are as cheap as the first
+        one, and pages don't shift when entries are added or removed before them.
+
+        An unknown cursor, a removed entry most likely, still finds its place when
+        listed by name, otherwise the listing starts over from the first page.
+
+        @param entries: tree entries, as returned by get_entries
+        @param key: applied to listing entries, with their size as when listed whole
+        @return: ListingPage
+        """
+        size = self.paginate_by
+        position = 0
+        found = False
+        if after is not None:
+            # Tree entries are tuples starting with the name
+            position = bisect.bisect_left(entries, (after,))
+            found = position < len(entries) and entries[position].name == after
+
+        if key is None:
+            start = position + 1 if found else position
+            page = entries[start : start + size + 1]
+        else:
+            sizes = {}
+            if self.list_sizes and key is not SORT_BY_NAME:
+                # Header reads, cached by OID, the key may sort by size
+                sizes = self.repo.read_sizes(
+                    [e.hex for e in entries if e.type == pygit2.GIT_OBJ_BLOB]
+                )
+
+            def sort_key(entry):
+                listed = models.ListingEntry(
+                    entry.name, path, entry.hex, entry.type, sizes.get(entry.hex)
+                )
+                return key(listed), entry.name
+
+            candidates = entries
+            if found:
+                cursor = sort_key(entries[position])
+                if reverse:
+                    candidates = (e for e in entries if sort_key(e) < cursor)
+                else:
+                    candidates = (e for e in entries if sort_key(e) > cursor)
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            page = select(size + 1, candidates, key=sort_key)
+
+        next_cursor = page[size - 1].name if len(page) > size else None
+        return models.ListingPage(
+            self.make_entries(path, page[:size]), len(entries), next_cursor
+        )
 
-        return sorted(objects, key=self.sort_key, reverse=self.sort_reverse)
+    def filter_trees(self, path: Path, paginate=False):
+        """Trees of the given tree, the current one is paginated if asked to."""
+        if not paginate or self.paginate_by is None:
+            return super().filter_trees(path)
+        trees, _blobs = self.get_entries(path)
+        return self.paginate(path, trees, self.get_cursor(self.trees_cursor_kwarg))
+
+    def filter_blobs(self):
+        if self.paginate_by is None:
+            _trees, blobs = self.get_listing(self.path)
+            return blobs
+        _trees, blobs = self.get_entries(self.path)
+        key = self.sort_key
+        if key is SORT_BY_NAME and not self.sort_reverse:
+            # Already in order
+            key = None
+        return self.paginate(
+            self.path,
+            blobs,
+            self.get_cursor(self.blobs_cursor_kwarg),
+            key=key,
+            reverse=self.sort_reverse,
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["trees"] = self.filter_trees(self.path)
+        context["trees"] = self.filter_trees(self.path, paginate=True)
         context["blobs"] = self.filter_blobs()
         return context
 
 
 class SharesViewMixin(TreeViewMixin):
     form_class = forms.RemoveUsersForm
+    # Lists permissions of other users
+    conditional = False
 
     def get_form(self):
+        # Users granted directly, group and anonymous rows have no user
         current_permissions = models.TreePermission.objects.current_permissions(
-            self.path
-        )
+            self.path, group=None
+        ).exclude(user=None)
         current_user_ids = current_permissions.values_list("user", flat=True)
 
         return self.get_form_class()(current_user_ids, **self.get_form_kwargs())
@@ -268,11 +580,13 @@ class SharesViewMixin(TreeViewMixin):
 
 class ShareViewMixin(TreeViewMixin):
     form_class = forms.AddUsersForm
+    conditional = False
 
     def get_form(self):
+        # Users granted directly, group and anonymous rows have no user
         current_permissions = models.TreePermission.objects.current_permissions(
-            self.path
-        )
+            self.path, group=None
+        ).exclude(user=None)
         current_user_ids = current_permissions.values_list("user", flat=True)
 
         return self.get_form_class()(current_user_ids, **self.get_form_kwargs())
@@ -284,6 +598,78 @@ class ShareViewMixin(TreeViewMixin):
         return super().form_valid(form)
 
 
+class SearchViewMixin(object):
+    """Search blobs and trees by name in the whole repository.
+
+    Results come from the path metadata, only those the user may browse.
+    """
+
+    query_kwarg = "q"
+    mode_kwarg = "mode"
+    # Maximum number of results
+    paginate_by = 50
+    # Computed once per request
+    permissions = None
+
+    def get_permissions(self):
+        """Tree permissions of the user, queried once per request."""
+        if self.permissions is None:
+            self.permissions = models.TreePermission.objects.index(self.request.user)
+        return self.permissions
+
+    def get_query(self):
+        return self.request.GET.get(self.query_kwarg, "").strip()
+
+    def get_mode(self):
+        mode = self.request.GET.get(self.mode_kwarg)
+        return mode if mode in search.MODES else search.PREFIX
+
+    def get_results(self):
+        """Listing entries matching the query, sorted by name."""
+        query = self.get_query()
+        if not query:
+            return []
+        results = (
+            models.PathMetadata.objects.search(query, self.get_mode())
+            .visible(self.get_permissions())
+            .not_hidden()
+        )
+        return [metadata.to_entry() for metadata in results[: self.paginate_by]]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.get_query()
+        context["mode"] = self.get_mode()
+        context["results"] = self.get_results()
+        return context
+
+
+class SearchApiViewMixin(SearchViewMixin):
+    """Search results as JSON."""
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(
+            {
+                "query": self.get_query(),
+                "mode": self.get_mode(),
+                "results": [
+                    {
+                        "path": entry.path,
+                        "type": odb.TYPE_NAMES[entry.type],
+                        "hex": entry.hex,
+                        "size": entry.size,
+                        "mimetype": (
+                            entry.mimetype
+                            if entry.type == pygit2.GIT_OBJ_BLOB
+                            else None
+                        ),
+                    }
+                    for entry in self.get_results()
+                ],
+            }
+        )
+
+
 class AdminPermissionMixin(object):
     """Enforce permission to require superuser, whatever the Git object type."""
 
@@ -335,7 +721,7 @@ class BaseRepositoryView(ObjectViewMixin, generic_views.View):
 
         def view(request, path, *args, **kwargs):
             # BEGIN gitstorage specific
-            repo = kwargs["repo"] = repository.Repository()
+            repo = kwargs["repo"] = repository.pool.get().snapshot()
 
             # Path methods must be mapped in the URLconf
             path = Path(path)
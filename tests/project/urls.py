@@ -14,6 +14,8 @@ urlpatterns = [
         r"^(?P<path>.*)/;shares$", views.TestSharesView.as_view(), name="tree_shares"
     ),
     re_path(r"^(?P<path>.*)/;share$", views.TestShareView.as_view(), name="tree_share"),
+    re_path(r"^;search$", views.TestSearchView.as_view(), name="search"),
+    re_path(r"^;search\.json$", views.TestSearchApiView.as_view(), name="search_api"),
     # Browse/catch-all view
     re_path(r"^(?P<path>.*)$", views.TestRepositoryView.as_view(), name="repo_browse"),
 ]
@@ -55,6 +55,15 @@ class TestBlobView(views.BlobViewMixin, generic.TemplateView):
 
 class TestTreeView(views.TreeViewMixin, generic.TemplateView):
     template_name = "base.html"
+    conditional = True
+
+
+class TestSearchView(views.SearchViewMixin, generic.TemplateView):
+    template_name = "base.html"
+
+
+class TestSearchApiView(views.SearchApiViewMixin, generic.View):
+    pass
 
 
 class TestRepositoryView(views.BaseRepositoryView):
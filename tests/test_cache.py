@@ -0,0 +1,129 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+
+from django.core.cache import caches
+from django.test import TestCase
+
+from gitstorage import cache
+
+
+class LRUCacheTestCase(TestCase):
+    def test_get_set(self):
+        lru = cache.LRUCache(2)
+        self.assertIsNone(lru.get("a"))
+        lru.set("a", 1)
+        self.assertEqual(lru.get("a"), 1)
+        self.assertEqual((lru.hits, lru.misses), (1, 1))
+
+    def test_evict_least_recently_used(self):
+        lru = cache.LRUCache(2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        self.assertIn("a", lru)
+        self.assertNotIn("b", lru)
+        self.assertIn("c", lru)
+
+    def test_evict_by_size(self):
+        lru = cache.LRUCache(10, sizeof=len)
+        lru.set("a", "x" * 4)
+        lru.set("b", "x" * 4)
+        lru.set("a", "x" * 5)
+        self.assertEqual(lru.size, 9)
+        lru.set("c", "x" * 3)
+        self.assertEqual(lru.size, 8)
+        self.assertNotIn("b", lru)
+        # Too big to fit
+        lru.set("d", "x" * 11)
+        self.assertNotIn("d", lru)
+        self.assertEqual(len(lru), 2)
+
+    def test_clear(self):
+        lru = cache.LRUCache(2)
+        lru.set("a", 1)
+        lru.get("a")
+        lru.clear()
+        self.assertEqual((len(lru), lru.size, lru.hits, lru.misses), (0, 0, 0, 0))
+
+
+class TieredCacheTestCase(TestCase):
+    def tearDown(self):
+        caches["default"].clear()
+        super().tearDown()
+
+    def test_local(self):
+        tiered = cache.TieredCache("test", 10)
+        self.assertIsNone(tiered.shared)
+        self.assertEqual(tiered.get_or_set("a", lambda: 1), 1)
+        self.assertEqual(tiered.get_or_set("a", lambda: 2), 1)
+        self.assertEqual((tiered.hits, tiered.misses), (1, 1))
+
+    def test_shared(self):
+        tiered = cache.TieredCache("test", 10, alias="default")
+        self.assertEqual(tiered.get_or_set("a", lambda: 1), 1)
+        self.assertEqual(caches["default"].get("gitstorage:test:a"), 1)
+
+        # Another process
+        other = cache.TieredCache("test", 10, alias="default")
+        self.assertEqual(other.get_or_set("a", lambda: 2), 1)
+        self.assertEqual((other.hits, other.misses), (1, 0))
+        self.assertIn("a", other.local)
+
+        other.clear()
+        self.assertEqual((len(other.local), other.hits, other.misses), (0, 0, 0))
+
+    def test_get_or_set_many(self):
+        tiered = cache.TieredCache("test", 10, alias="default")
+        tiered.get_or_set("a", lambda: 1)
+        computed = []
+
+        def compute_many(keys):
+            computed.extend(keys)
+            return {key: key.upper() for key in keys}
+
+        self.assertEqual(
+            tiered.get_or_set_many(["a", "b", "c"], compute_many),
+            {"a": 1, "b": "B", "c": "C"},
+        )
+        self.assertEqual(computed, ["b", "c"])
+        self.assertEqual(caches["default"].get("gitstorage:test:b"), "B")
+
+        # Another process
+        other = cache.TieredCache("test", 10, alias="default")
+        self.assertEqual(
+            other.get_or_set_many(["b", "c"], compute_many), {"b": "B", "c": "C"}
+        )
+        self.assertEqual(computed, ["b", "c"])
+        self.assertEqual((other.hits, other.misses), (2, 0))
+
+    def test_threads(self):
+        tiered = cache.TieredCache("test", 10)
+        tiered.get_or_set("a", lambda: 1)
+
+        def get():
+            for _ in range(1000):
+                tiered.get_or_set("a", lambda: 2)
+                tiered.get_or_set_many(["a"], dict)
+
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # No update lost
+        self.assertEqual((tiered.hits, tiered.misses), (8000, 1))
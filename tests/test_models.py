@@ -14,8 +14,16 @@
 #    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
 
 from pathlib import Path
+from unittest import skipUnless
 
-from django.test.testcases import TestCase
+import pygit2
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth import models as auth_models
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models.signals import m2m_changed, post_delete
+from django.test.testcases import TestCase, TransactionTestCase
 
 from gitstorage import factories
 from gitstorage import models
@@ -41,6 +49,50 @@ class TreeTestCase(TestCase):
         self.assertEqual(str(self.tree), "c0d11342c4241087e3c126f7666d618586e39068")
 
 
+class ListingEntryTestCase(TestCase):
+    def setUp(self):
+        self.blob = models.ListingEntry(
+            "archive.tar.gz",
+            Path("my/path"),
+            "c0d11342c4241087e3c126f7666d618586e39068",
+            pygit2.GIT_OBJ_BLOB,
+        )
+        self.tree = models.ListingEntry(
+            "my_name",
+            Path(""),
+            "c0d11342c4241087e3c126f7666d618586e39068",
+            pygit2.GIT_OBJ_TREE,
+        )
+
+    def test_attributes(self):
+        self.assertEqual(self.blob.path, "my/path/archive.tar.gz")
+        self.assertEqual(self.tree.path, "my_name")
+        self.assertEqual(self.blob.id, self.blob.hex)
+        self.assertIsNone(self.blob.size)
+        self.assertEqual(self.blob.mimetype, "application/x-tar")
+        self.assertEqual(self.blob.encoding, "gzip")
+        self.assertEqual(self.tree.mimetype, "application/octet-stream")
+        self.assertEqual(repr(self.tree), "<ListingEntry my_name>")
+        self.assertFalse(hasattr(self.blob, "__dict__"))
+
+    def test_items(self):
+        self.assertEqual(self.blob["name"], "archive.tar.gz")
+        self.assertEqual(self.blob["path"], "my/path/archive.tar.gz")
+        self.assertRaises(KeyError, self.blob.__getitem__, "unknown")
+
+    def test_models(self):
+        blob = self.blob["blob"]
+        self.assertIsInstance(blob, models.Blob)
+        self.assertEqual(blob.pk, self.blob.hex)
+        self.assertEqual(blob.name, "archive.tar.gz")
+        # Built once
+        self.assertIs(self.blob.blob, blob)
+
+        tree = self.tree["tree"]
+        self.assertIsInstance(tree, models.Tree)
+        self.assertEqual(tree.pk, self.tree.hex)
+
+
 class TreePermissionManagerTestCase(TestCase):
     def setUp(self):
         self.anonymous = factories.AnonymousUserFactory()
@@ -96,6 +148,21 @@ class TreePermissionManagerTestCase(TestCase):
         allowed_paths = models.TreePermission.objects.allowed_paths(self.other_user)
         self.assertEqual(allowed_paths, [])
 
+    def test_index(self):
+        with self.assertNumQueries(1):
+            index = models.TreePermission.objects.index(self.user)
+        self.assertTrue(index.is_allowed(Path("my/path/my_name")))
+        self.assertEqual(index.allowed_names(Path("my/path")), {"my_name"})
+
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                models.TreePermission.objects.index(self.superuser).is_unrestricted
+            )
+
+        index = models.TreePermission.objects.index(self.anonymous)
+        self.assertFalse(index.is_allowed(Path("my/path/my_name")))
+        self.assertEqual(len(index), 0)
+
     def test_is_allowed(self):
         path = Path("my/path/my_name")
         self.assertFalse(models.TreePermission.objects.is_allowed(self.anonymous, path))
@@ -121,3 +188,332 @@ class TreePermissionManagerTestCase(TestCase):
         models.TreePermission.objects.remove([self.user], Path("my/path/my_name"))
         # Nothing raised
         models.TreePermission.objects.remove([self.other_user], Path("my/path/my_name"))
+
+    def test_grant(self):
+        users = [factories.UserFactory() for _ in range(50)] + [None]
+        paths = [Path("my/path/my_name"), Path("other")]
+        with self.assertNumQueries(1):
+            models.TreePermission.objects.grant(users, paths)
+        self.assertEqual(models.TreePermission.objects.count(), 1 + 51 * 2)
+
+        # Already granted
+        models.TreePermission.objects.grant([self.user, None], paths)
+        self.assertEqual(models.TreePermission.objects.count(), 1 + 51 * 2 + 1)
+
+    def test_revoke(self):
+        models.TreePermission.objects.grant(
+            [self.user, self.other_user, None], [Path("my/path/my_name"), Path("other")]
+        )
+        deleted = []
+
+        def receiver(instance, **kwargs):
+            deleted.append(instance)
+
+        post_delete.connect(receiver, sender=models.TreePermission)
+        self.addCleanup(post_delete.disconnect, receiver)
+        with self.assertNumQueries(1):
+            models.TreePermission.objects.revoke(
+                [self.user, None], [Path("my/path/my_name"), Path("other")]
+            )
+        self.assertEqual(deleted, [])
+        self.assertQuerysetEqual(
+            models.TreePermission.objects.order_by("parent_path", "name"),
+            [
+                "<TreePermission: alice_bob on other>",
+                "<TreePermission: alice_bob on my/path/my_name>",
+            ],
+        )
+
+    def test_unique(self):
+        for user in (self.user, None):
+            models.TreePermission.objects.create(
+                parent_path="unique", name="name", user=user
+            )
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                models.TreePermission.objects.create(
+                    parent_path="unique", name="name", user=user
+                )
+
+
+class RecursivePermissionTestCase(TestCase):
+    def setUp(self):
+        self.user = factories.UserFactory(username="john_doe")
+        self.other_user = factories.UserFactory(username="alice_bob")
+        self.path = Path("archives/2020")
+        models.TreePermission.objects.grant([self.user], [self.path], recursive=True)
+        models.TreePermission.objects.grant([self.other_user], [self.path / "january"])
+
+    def test_path(self):
+        self.assertEqual(
+            sorted(models.TreePermission.objects.values_list("path", flat=True)),
+            ["archives/2020", "archives/2020/january"],
+        )
+        permission = factories.TreePermissionFactory(parent_path=".", name="root")
+        self.assertEqual(permission.path, "root")
+
+    def test_is_allowed(self):
+        for path in ("archives/2020", "archives/2020/january", "archives/2020/a/b/c"):
+            with self.assertNumQueries(1):
+                self.assertTrue(
+                    models.TreePermission.objects.is_allowed(self.user, Path(path))
+                )
+        self.assertFalse(
+            models.TreePermission.objects.is_allowed(self.user, Path("archives"))
+        )
+        self.assertFalse(
+            models.TreePermission.objects.is_allowed(
+                self.other_user, Path("archives/2020/january/sub")
+            )
+        )
+
+    def test_allowed_names(self):
+        self.assertEqual(
+            models.TreePermission.objects.allowed_names(self.user, Path("archives")),
+            ["2020"],
+        )
+        with self.assertNumQueries(1):
+            self.assertIsNone(
+                models.TreePermission.objects.allowed_names(
+                    self.user, Path("archives/2020/january")
+                )
+            )
+        self.assertEqual(
+            models.TreePermission.objects.allowed_names(
+                self.other_user, Path("archives/2020")
+            ),
+            ["january"],
+        )
+
+    def test_index(self):
+        index = models.TreePermission.objects.index(self.user)
+        self.assertTrue(index.is_allowed(Path("archives/2020/a/b")))
+        self.assertIsNone(index.allowed_names(Path("archives/2020/a")))
+
+    def test_made_recursive(self):
+        models.TreePermission.objects.grant(
+            [self.other_user], [self.path / "january"], recursive=True
+        )
+        self.assertTrue(
+            models.TreePermission.objects.is_allowed(
+                self.other_user, Path("archives/2020/january/sub")
+            )
+        )
+        self.assertEqual(models.TreePermission.objects.count(), 2)
+
+        # Not the other way around
+        models.TreePermission.objects.grant([self.user], [self.path])
+        self.assertTrue(models.TreePermission.objects.get(user=self.user).recursive)
+
+    def test_revoke(self):
+        models.TreePermission.objects.revoke([self.user], [self.path])
+        self.assertFalse(
+            models.TreePermission.objects.is_allowed(
+                self.user, Path("archives/2020/january")
+            )
+        )
+
+
+class GroupPermissionTestCase(TestCase):
+    def setUp(self):
+        self.anonymous = factories.AnonymousUserFactory()
+        self.user = factories.UserFactory(username="john_doe")
+        self.other_user = factories.UserFactory(username="alice_bob")
+        self.group = auth_models.Group.objects.create(name="staff")
+        self.user.groups.add(self.group)
+        self.path = Path("my/path/my_name")
+        models.TreePermission.objects.grant([], [self.path], groups=[self.group])
+
+    def test_str(self):
+        self.assertQuerysetEqual(
+            models.TreePermission.objects.current_permissions(self.path),
+            ["<TreePermission: staff on my/path/my_name>"],
+        )
+
+    def test_members(self):
+        self.assertTrue(models.TreePermission.objects.is_allowed(self.user, self.path))
+        self.assertEqual(
+            list(
+                models.TreePermission.objects.allowed_names(self.user, self.path.parent)
+            ),
+            ["my_name"],
+        )
+        self.assertTrue(
+            models.TreePermission.objects.index(self.user).is_allowed(self.path)
+        )
+        self.assertEqual(
+            models.TreePermission.objects.allowed_paths(self.user), ["my/path/my_name"]
+        )
+
+    def test_not_members(self):
+        for user in (self.other_user, self.anonymous, None):
+            self.assertFalse(models.TreePermission.objects.is_allowed(user, self.path))
+            self.assertFalse(
+                models.TreePermission.objects.index(user).is_allowed(self.path)
+            )
+
+    def test_both(self):
+        # Granted to the user and to their group
+        models.TreePermission.objects.grant([self.user], [self.path])
+        index = models.TreePermission.objects.index(self.user)
+        self.assertEqual(len(index), 1)
+
+        models.TreePermission.objects.revoke([], [self.path], groups=[self.group])
+        self.assertTrue(models.TreePermission.objects.is_allowed(self.user, self.path))
+        self.assertEqual(models.TreePermission.objects.count(), 1)
+
+    def test_memberships_signal(self):
+        user_model = get_user_model()
+        self.assertTrue(m2m_changed.has_listeners(user_model.groups.through))
+        self.assertFalse(
+            m2m_changed.has_listeners(auth_models.Group.permissions.through)
+        )
+
+    def test_no_groups(self):
+        # A swapped user model without groups, only granted directly
+        self.assertIsNone(models.group_memberships(self.group))
+        self.assertEqual(
+            list(models.group_memberships(self.user).values_list("group", flat=True)),
+            [self.group.pk],
+        )
+
+    def test_constraints(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            models.TreePermission.objects.create(
+                parent_path="my/path", name="my_name", group=self.group
+            )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            models.TreePermission.objects.create(
+                parent_path="other", name="", group=self.group, user=self.user
+            )
+        # Not the anonymous permission
+        models.TreePermission.objects.create(parent_path="my/path", name="my_name")
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN output differs by database")
+class TreePermissionQueryPlanTestCase(TestCase):
+    """Hot queries must be answered from an index, the table only for related users."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(20):
+            user = factories.UserFactory()
+            group = auth_models.Group.objects.create(name="group{0}".format(i))
+            user.groups.add(group)
+            models.TreePermission.objects.grant(
+                [user],
+                [Path("dir{0}/user{1}-{2}".format(j % 10, i, j)) for j in range(50)],
+                groups=[group],
+            )
+        models.TreePermission.objects.grant(
+            [None], [Path("dir{0}/anonymous{1}".format(j % 10, j)) for j in range(50)]
+        )
+        cls.user = user
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertPlan(self, queryset, *indexes):
+        plan = queryset.explain()
+        for index in indexes:
+            self.assertIn(index, plan)
+        self.assertNotIn("SCAN", plan)
+        return plan
+
+    def test_granted_paths(self):
+        self.assertPlan(
+            models.TreePermission.objects.granted_paths(self.user),
+            "COVERING INDEX gitstorage_tp_user_path",
+            "COVERING INDEX gitstorage_tp_group_path",
+        )
+        self.assertPlan(
+            models.TreePermission.objects.granted_paths(None),
+            "INDEX gitstorage_tp_",
+        )
+
+    def test_allowed_names(self):
+        for user in (self.user, None):
+            self.assertPlan(
+                models.TreePermission.objects.in_tree(user, Path("dir1")).values_list(
+                    "path", "name"
+                ),
+                "parent_path=?",
+                "INDEX gitstorage_tp_recursive_path (path=?)",
+            )
+
+    def test_for_user(self):
+        path = Path("dir1/sub10")
+        self.assertPlan(
+            models.TreePermission.objects.for_user(self.user, path).values("pk"),
+            "parent_path=? AND name=?",
+        )
+
+    def test_other_permissions(self):
+        queryset = (
+            models.TreePermission.objects.filter(
+                models.grantee_filter(self.user), parent_path="dir1"
+            )
+            .exclude(name="sub10")
+            .values("pk")
+        )
+        self.assertPlan(queryset, "parent_path=?")
+
+    def test_current_permissions(self):
+        self.assertPlan(
+            models.TreePermission.objects.current_permissions(Path("dir1/sub10")),
+            # One of the unique constraints, automatic indexes on SQLite
+            "INDEX sqlite_autoindex_gitstorage_treepermission_",
+        )
+
+
+class MigrationTestCase(TransactionTestCase):
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([("gitstorage", target)])
+        return executor.loader.project_state([("gitstorage", target)]).apps
+
+    def test_remove_duplicate_permissions(self):
+        apps = self.migrate("0005_remove_duplicate_permissions")
+        # The user model is not migrated, only its state is old
+        user = get_user_model().objects.create(username="john_doe")
+        TreePermission = apps.get_model("gitstorage", "TreePermission")
+        for _ in range(2):
+            TreePermission.objects.create(
+                parent_path="my", name="path", user_id=user.pk
+            )
+            TreePermission.objects.create(parent_path="my", name="path", user=None)
+        TreePermission.objects.create(parent_path="my", name="other", user=None)
+        self.migrate("0004_auto_20200921_1520")
+
+        apps = self.migrate("0006_treepermission_unique")
+        TreePermission = apps.get_model("gitstorage", "TreePermission")
+        self.assertEqual(TreePermission.objects.count(), 3)
+
+    def test_materialize_paths(self):
+        apps = self.migrate("0008_treepermission_group")
+        TreePermission = apps.get_model("gitstorage", "TreePermission")
+        TreePermission.objects.create(parent_path="my/path", name="my_name")
+        TreePermission.objects.create(parent_path=".", name="root")
+        TreePermission.objects.create(parent_path=".", name="")
+
+        apps = self.migrate("0009_treepermission_recursive")
+        TreePermission = apps.get_model("gitstorage", "TreePermission")
+        self.assertEqual(
+            sorted(TreePermission.objects.values_list("path", flat=True)),
+            [".", "my/path/my_name", "root"],
+        )
+
+    def test_fold_names(self):
+        apps = self.migrate("0010_pathmetadata")
+        PathMetadata = apps.get_model("gitstorage", "PathMetadata")
+        PathMetadata.objects.create(
+            parent_path=".", name="Dépôt.TXT", path="Dépôt.TXT", hex="0" * 40, type=3
+        )
+
+        apps = self.migrate("0011_pathmetadata_folded_name")
+        PathMetadata = apps.get_model("gitstorage", "PathMetadata")
+        self.assertEqual(PathMetadata.objects.get().folded_name, "depot.txt")
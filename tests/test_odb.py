@@ -0,0 +1,86 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+
+import pygit2
+
+from django.test import TestCase
+
+from gitstorage import odb
+from gitstorage import repository
+from gitstorage.tests.utils import VanillaRepositoryMixin
+
+
+class ObjectDatabaseTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = repository.Repository()
+
+    def pack(self):
+        """Move every loose object to a pack, return a repository opened afterwards."""
+        objects = os.path.join(self.repo.path, "objects")
+        os.makedirs(os.path.join(objects, "pack"), exist_ok=True)
+        self.repo.pack()
+        for name in os.listdir(objects):
+            if len(name) == 2:
+                shutil.rmtree(os.path.join(objects, name))
+        return repository.Repository()
+
+    def assertHeaders(self, repo, oids):
+        with odb.ObjectDatabase(repo) as database:
+            for oid in oids:
+                type, data = repo.odb.read(oid)
+                self.assertEqual(database.read_header(oid), (type, len(data)))
+
+    def test_loose(self):
+        oids = [self.repo.commit.id, self.repo.tree.id, self.repo.open("foo.txt").id]
+        with odb.ObjectDatabase(self.repo) as database:
+            self.assertEqual(
+                database.read_loose_header(str(oids[2])),
+                (pygit2.GIT_OBJ_BLOB, self.repo[oids[2]].size),
+            )
+        self.assertHeaders(self.repo, oids)
+
+    def test_packed(self):
+        oids = list(self.repo.odb)
+        repo = self.pack()
+        with odb.ObjectDatabase(repo) as database:
+            self.assertIsNone(database.read_loose_header(str(oids[0])))
+        self.assertHeaders(repo, oids)
+
+    def test_packed_deltas(self):
+        # Similar blobs are stored as deltas of each other
+        session = self.repo.write_session()
+        content = b"".join(b"line %d\n" % i for i in range(1000))
+        oids = [
+            session.add("versions/{0}.txt".format(i), content + b"version %d\n" % i)
+            for i in range(10)
+        ]
+        session.commit("versions")
+        repo = self.pack()
+
+        with odb.ObjectDatabase(repo) as database:
+            database.load_packs()
+            (pack,) = database.packs
+            types = {pack.read_entry(pack.find_offset(oid.raw))[0] for oid in oids}
+        self.assertTrue(types & {odb.OFS_DELTA, odb.REF_DELTA})
+        self.assertHeaders(repo, oids)
+
+    def test_missing(self):
+        with odb.ObjectDatabase(self.repo) as database:
+            with self.assertRaises(KeyError):
+                database.read_header("0" * 40)
@@ -0,0 +1,237 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import models as auth_models
+from django.core.cache import caches
+from django.test import TestCase
+
+from gitstorage import factories
+from gitstorage import models
+from gitstorage import permissions
+
+
+class PermissionIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = permissions.PermissionIndex(
+            [
+                (".", "foo", False),
+                ("foo/bar", "baz", False),
+                ("foo/bar", "qux", False),
+                ("other", "", False),
+            ]
+        )
+
+    def test_len(self):
+        self.assertEqual(len(self.index), 4)
+        self.assertFalse(self.index.is_unrestricted)
+
+    def test_is_allowed(self):
+        self.assertTrue(self.index.is_allowed(Path("foo")))
+        self.assertTrue(self.index.is_allowed(Path("foo/bar/baz")))
+        self.assertTrue(self.index.is_allowed("other"))
+        # No inheritance, the intermediate tree is not granted
+        self.assertFalse(self.index.is_allowed(Path("foo/bar")))
+        self.assertFalse(self.index.is_allowed(Path("foo/bar/baz/sub")))
+        self.assertFalse(self.index.is_allowed(Path("")))
+        self.assertFalse(self.index.is_allowed(Path("unknown")))
+
+    def test_allowed_names(self):
+        self.assertEqual(self.index.allowed_names(Path("")), {"foo", "other"})
+        self.assertEqual(self.index.allowed_names(Path("foo")), set())
+        self.assertEqual(self.index.allowed_names(Path("foo/bar")), {"baz", "qux"})
+        self.assertEqual(self.index.allowed_names(Path("unknown")), set())
+
+    def test_allowed_paths(self):
+        breadcrumbs = [Path("foo"), Path("foo/bar"), Path("foo/bar/baz")]
+        self.assertEqual(
+            self.index.allowed_paths(breadcrumbs), [Path("foo"), Path("foo/bar/baz")]
+        )
+
+    def test_granted_paths(self):
+        self.assertEqual(
+            self.index.granted_paths(),
+            (["foo", "foo/bar/baz", "foo/bar/qux", "other"], []),
+        )
+        index = permissions.PermissionIndex([(".", "", False), ("foo", "bar", True)])
+        self.assertEqual(index.granted_paths(), (["."], ["foo/bar"]))
+        self.assertEqual(permissions.PermissionIndex().granted_paths(), ([], []))
+
+    def test_root(self):
+        index = permissions.PermissionIndex([(".", "", False)])
+        self.assertTrue(index.is_allowed(Path("")))
+        self.assertFalse(index.is_allowed(Path("foo")))
+
+    def test_recursive(self):
+        index = permissions.PermissionIndex(
+            [
+                ("foo", "bar", True),
+                ("foo/bar/baz", "qux", False),
+                ("foo", "other", False),
+            ]
+        )
+        self.assertEqual(len(index), 3)
+        self.assertFalse(index.is_allowed(Path("foo")))
+        self.assertTrue(index.is_allowed(Path("foo/bar")))
+        self.assertTrue(index.is_allowed(Path("foo/bar/baz/qux/deep")))
+        self.assertFalse(index.is_allowed(Path("foo/other/sub")))
+        self.assertEqual(index.allowed_names(Path("foo")), {"bar", "other"})
+        self.assertIsNone(index.allowed_names(Path("foo/bar")))
+        self.assertIsNone(index.allowed_names(Path("foo/bar/unknown")))
+
+        # Made recursive
+        index.add(Path("foo/other"), recursive=True)
+        self.assertTrue(index.is_allowed(Path("foo/other/sub")))
+        index.add(Path("foo/other"))
+        self.assertTrue(index.is_allowed(Path("foo/other/sub")))
+
+    def test_recursive_root(self):
+        index = permissions.PermissionIndex([(".", "", True)])
+        self.assertTrue(index.is_allowed(Path("")))
+        self.assertTrue(index.is_allowed(Path("foo/bar")))
+        self.assertIsNone(index.allowed_names(Path("")))
+
+    def test_ancestors(self):
+        self.assertEqual(
+            permissions.ancestors(Path("foo/bar")), ["foo/bar", "foo", "."]
+        )
+        self.assertEqual(permissions.ancestors(Path("")), ["."])
+        self.assertEqual(permissions.materialized_path(".", "foo"), "foo")
+        self.assertEqual(permissions.materialized_path(".", ""), ".")
+
+    def test_unrestricted(self):
+        index = permissions.PermissionIndex(None)
+        self.assertTrue(index.is_unrestricted)
+        self.assertTrue(index.is_allowed(Path("anything")))
+        self.assertIsNone(index.allowed_names(Path("")))
+        self.assertEqual(index.allowed_paths([Path("foo")]), [Path("foo")])
+
+
+class PermissionCacheTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()
+        patcher = mock.patch.object(
+            permissions, "permission_cache", permissions.PermissionCache("default", 10)
+        )
+        self.permission_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = factories.UserFactory()
+        self.other_user = factories.UserFactory()
+        factories.TreePermissionFactory(parent_path=".", name="foo", user=self.user)
+
+    def tearDown(self):
+        caches["default"].clear()
+        super().tearDown()
+
+    def assertCached(self, user, cached=True):
+        with self.assertNumQueries(0 if cached else 1):
+            return models.TreePermission.objects.index(user)
+
+    def test_cached(self):
+        index = self.assertCached(self.user, cached=False)
+        self.assertTrue(index.is_allowed(Path("foo")))
+        self.assertIs(self.assertCached(self.user), index)
+
+        # Another process
+        self.permission_cache.indexes.clear()
+        index = self.assertCached(self.user)
+        self.assertTrue(index.is_allowed(Path("foo")))
+
+    def test_anonymous_shared(self):
+        self.assertCached(factories.AnonymousUserFactory(), cached=False)
+        self.assertCached(factories.AnonymousUserFactory())
+        self.assertCached(None)
+
+    def test_add_remove(self):
+        self.assertCached(self.user, cached=False)
+        self.assertCached(self.other_user, cached=False)
+
+        models.TreePermission.objects.add([self.other_user], Path("bar"))
+        self.assertCached(self.user)
+        index = self.assertCached(self.other_user, cached=False)
+        self.assertTrue(index.is_allowed(Path("bar")))
+
+        models.TreePermission.objects.remove([self.other_user], Path("bar"))
+        self.assertCached(self.user)
+        index = self.assertCached(self.other_user, cached=False)
+        self.assertFalse(index.is_allowed(Path("bar")))
+
+    def test_signals(self):
+        self.assertCached(self.user, cached=False)
+        permission = factories.TreePermissionFactory(
+            parent_path=".", name="bar", user=self.user
+        )
+        self.assertCached(self.user, cached=False)
+
+        permission.delete()
+        self.assertCached(self.user, cached=False)
+
+        # Bulk delete
+        models.TreePermission.objects.filter(user=self.user).delete()
+        index = self.assertCached(self.user, cached=False)
+        self.assertEqual(len(index), 0)
+
+    def test_groups(self):
+        group = auth_models.Group.objects.create(name="staff")
+        self.assertCached(self.user, cached=False)
+        models.TreePermission.objects.grant([], [Path("bar")], groups=[group])
+        self.assertCached(self.user, cached=False)
+
+        self.user.groups.add(group)
+        index = self.assertCached(self.user, cached=False)
+        self.assertTrue(index.is_allowed(Path("bar")))
+
+        group.user_set.remove(self.user)
+        index = self.assertCached(self.user, cached=False)
+        self.assertFalse(index.is_allowed(Path("bar")))
+
+        self.user.groups.add(group)
+        self.assertCached(self.user, cached=False)
+        group.delete()
+        index = self.assertCached(self.user, cached=False)
+        self.assertFalse(index.is_allowed(Path("bar")))
+
+    def test_other_m2m(self):
+        group = auth_models.Group.objects.create(name="staff")
+        self.assertCached(self.user, cached=False)
+        # Only the groups of the user model invalidate
+        group.permissions.add(auth_models.Permission.objects.first())
+        self.user.user_permissions.add(auth_models.Permission.objects.first())
+        self.assertCached(self.user)
+
+    def test_update(self):
+        self.assertCached(self.user, cached=False)
+        self.assertCached(self.other_user, cached=False)
+        models.TreePermission.objects.update(user=self.other_user)
+        self.assertEqual(len(self.assertCached(self.user, cached=False)), 0)
+        self.assertEqual(len(self.assertCached(self.other_user, cached=False)), 1)
+
+    def test_evicted_version(self):
+        self.assertCached(self.user, cached=False)
+        versions = self.permission_cache.get_versions(self.user.pk)
+        self.permission_cache.bump(self.user.pk)
+        caches["default"].delete(self.permission_cache.version_key(self.user.pk))
+        self.assertNotEqual(self.permission_cache.get_versions(self.user.pk), versions)
+        self.assertCached(self.user, cached=False)
+
+    def test_disabled(self):
+        with mock.patch.object(
+            permissions, "permission_cache", permissions.PermissionCache(None, 10)
+        ):
+            self.assertCached(self.user, cached=False)
+            self.assertCached(self.user, cached=False)
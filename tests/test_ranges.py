@@ -0,0 +1,89 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.test import TestCase
+
+from gitstorage import ranges
+
+
+class ParseRangeHeaderTestCase(TestCase):
+    def parse(self, header, size=100):
+        return ranges.parse_range_header(header, size)
+
+    def test_missing(self):
+        self.assertIsNone(self.parse(None))
+        self.assertIsNone(self.parse(""))
+
+    def test_ranges(self):
+        self.assertEqual(self.parse("bytes=0-9"), [(0, 10)])
+        self.assertEqual(self.parse("bytes=90-"), [(90, 100)])
+        self.assertEqual(self.parse("bytes=-10"), [(90, 100)])
+        self.assertEqual(self.parse("bytes=-200"), [(0, 100)])
+        self.assertEqual(self.parse("bytes=50-200"), [(50, 100)])
+        self.assertEqual(self.parse("bytes=0-0, 10-19"), [(0, 1), (10, 20)])
+
+    def test_ignored(self):
+        self.assertIsNone(self.parse("items=0-9"))
+        self.assertIsNone(self.parse("bytes=9-0"))
+        self.assertIsNone(self.parse("bytes=a-b"))
+        self.assertIsNone(self.parse("bytes=-"))
+        self.assertIsNone(self.parse("bytes=0"))
+        too_many = ",".join(["0-1"] * (ranges.MAX_RANGES + 1))
+        self.assertIsNone(self.parse(f"bytes={too_many}"))
+        # More than the data, sent once
+        self.assertIsNone(self.parse("bytes=0-,0-"))
+        self.assertIsNone(self.parse("bytes=0-59,40-99"))
+
+    def test_merged(self):
+        self.assertEqual(self.parse("bytes=10-19, 0-4"), [(0, 5), (10, 20)])
+        self.assertEqual(self.parse("bytes=0-9, 5-14"), [(0, 15)])
+        self.assertEqual(self.parse("bytes=0-9, 10-19"), [(0, 20)])
+        self.assertEqual(self.parse("bytes=-10, 80-89"), [(80, 100)])
+
+    def test_not_satisfiable(self):
+        self.assertRaises(ranges.RangeNotSatisfiable, self.parse, "bytes=100-")
+        self.assertRaises(ranges.RangeNotSatisfiable, self.parse, "bytes=-0")
+        # Unsatisfiable ranges are dropped
+        self.assertEqual(self.parse("bytes=100-, 0-1"), [(0, 2)])
+
+
+class MultipartByterangesTestCase(TestCase):
+    def test_body(self):
+        data = b"0123456789"
+        body = ranges.MultipartByteranges(
+            [(0, 2), (5, 10)],
+            len(data),
+            "text/plain",
+            lambda start, end: [data[start:end]],
+        )
+        self.assertTrue(body.content_type.endswith(body.boundary))
+        content = b"".join(body)
+        self.assertEqual(len(content), len(body))
+        self.assertEqual(
+            content,
+            (
+                f"--{body.boundary}\r\n"
+                "Content-Type: text/plain\r\n"
+                "Content-Range: bytes 0-1/10\r\n"
+                "\r\n"
+                "01\r\n"
+                f"--{body.boundary}\r\n"
+                "Content-Type: text/plain\r\n"
+                "Content-Range: bytes 5-9/10\r\n"
+                "\r\n"
+                "56789\r\n"
+                f"--{body.boundary}--\r\n"
+            ).encode(),
+        )
@@ -0,0 +1,256 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+
+import pygit2
+
+from django.test import TestCase
+
+from gitstorage import repository
+from gitstorage.tests.utils import VanillaRepositoryMixin
+
+
+class RepositoryPoolTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.pool = repository.RepositoryPool()
+
+    def commit_empty_tree(self, repo):
+        tree = repo.TreeBuilder().write()
+        signature = pygit2.Signature("Git Storage", "git@storage")
+        repo.create_commit(
+            "HEAD", signature, signature, "empty", tree, [repo.head.target]
+        )
+
+    def test_reuse(self):
+        repo = self.pool.get()
+        self.assertIs(self.pool.get(), repo)
+
+    def test_head_moved(self):
+        repo = self.pool.get()
+        self.commit_empty_tree(repository.Repository())
+        other = self.pool.get()
+        self.assertIsNot(other, repo)
+        self.assertEqual(other.head.target, self.pool.head)
+        self.assertIs(self.pool.get(), other)
+
+    def test_forked(self):
+        repo = self.pool.get()
+        self.pool.pid = -1
+        self.assertIsNot(self.pool.get(), repo)
+
+    def test_path_changed(self):
+        repo = self.pool.get()
+        self.pool.path = "elsewhere"
+        self.assertIsNot(self.pool.get(), repo)
+
+    def test_clear(self):
+        repo = self.pool.get()
+        self.pool.clear()
+        self.assertIsNone(self.pool.repo)
+        self.assertIsNot(self.pool.get(), repo)
+
+
+class RepositoryTestCase(VanillaRepositoryMixin, TestCase):
+    def test_index(self):
+        repo = repository.Repository()
+        # Loaded from the head tree on first access, kept afterwards
+        self.assertIn("foo/bar/baz/qux.txt", repo.index)
+        repo.index.add(pygit2.IndexEntry("new.txt", repo.create_blob(b"new"), 0o100644))
+        tree = repo[repo.index.write_tree()]
+        self.assertIn("foo/bar/baz/qux.txt", tree)
+        self.assertIn("new.txt", tree)
+
+
+class WriteSessionTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = repository.Repository()
+
+    def test_commit(self):
+        parent = self.repo.head.target
+        session = self.repo.write_session()
+        self.assertIn("foo/bar/baz/qux.txt", session.index)
+        oid = session.add("new/file.txt", b"new file")
+        session.remove("foo.txt")
+        commit_id = session.commit("Add and remove")
+
+        self.assertEqual(self.repo.head.target, commit_id)
+        self.assertEqual(self.repo.commit.parents[0].id, parent)
+        self.assertEqual(self.repo.open("new/file.txt").id, oid)
+        self.assertRaises(KeyError, self.repo.open, "foo.txt")
+        self.assertEqual(self.repo.open("foo/bar/baz/qux.txt").data, b"qux\n")
+
+    def test_head_moved(self):
+        session = self.repo.write_session()
+        session.add("first.txt", b"first")
+        other = self.repo.write_session()
+        other.add("second.txt", b"second")
+        session.commit("First")
+        self.assertRaises(pygit2.GitError, other.commit, "Second")
+
+
+class SnapshotTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = repository.Repository()
+
+    def test_open(self):
+        snapshot = self.repo.snapshot()
+        self.assertEqual(snapshot.commit.id, self.repo.head.target)
+        self.assertEqual(snapshot.open("").id, self.repo.tree.id)
+        self.assertEqual(snapshot.open("foo.txt").data, b"foo\n")
+        self.assertRaises(KeyError, snapshot.open, "toto/coin")
+
+    def test_repository_api(self):
+        snapshot = self.repo.snapshot()
+        self.assertEqual(snapshot.head.target, self.repo.head.target)
+        self.assertEqual(
+            [commit.id for commit in snapshot.walk(snapshot.commit.id)],
+            [commit.id for commit in self.repo.walk(self.repo.head.target)],
+        )
+        session = snapshot.write_session()
+        session.add("new.txt", b"new")
+        session.commit("New")
+        # The snapshot is still pinned, the rest follows the repository
+        self.assertRaises(KeyError, snapshot.open, "new.txt")
+        self.assertEqual(snapshot.head.target, self.repo.head.target)
+        self.assertRaises(AttributeError, getattr, snapshot, "unknown")
+
+    def test_resolve_cached(self):
+        repository.resolve_cache.clear()
+        snapshot = self.repo.snapshot()
+        object_id, type, filemode = snapshot.resolve("foo/bar/baz/qux.txt")
+        self.assertEqual(type, pygit2.GIT_OBJ_BLOB)
+        self.assertEqual(filemode, pygit2.GIT_FILEMODE_BLOB)
+        self.assertEqual(snapshot.resolve("foo/bar/baz/qux.txt")[0], object_id)
+        self.assertEqual(
+            (repository.resolve_cache.hits, repository.resolve_cache.misses), (1, 1)
+        )
+
+        # Not found is cached too
+        self.assertRaises(KeyError, snapshot.resolve, "toto/coin")
+        self.assertRaises(KeyError, snapshot.open, "toto/coin")
+        self.assertEqual(
+            (repository.resolve_cache.hits, repository.resolve_cache.misses), (2, 2)
+        )
+
+    def test_listdir(self):
+        trees, blobs = self.repo.snapshot().listdir("foo/bar")
+        self.assertEqual([entry.name for entry in trees], ["baz"])
+        self.assertEqual(blobs, ())
+
+    def test_listdir_cached(self):
+        repository.listing_cache.clear()
+        snapshot = self.repo.snapshot()
+        listing = snapshot.listdir("foo/bar")
+        self.assertEqual(repository.listing_cache.misses, 1)
+
+        # Same tree, whatever the path or the commit
+        self.assertIs(self.repo.listdir("foo/bar"), listing)
+        self.assertEqual(repository.listing_cache.hits, 1)
+        self.assertIn(snapshot.open("foo/bar").hex, repository.listing_cache.local)
+
+    def test_read_sizes(self):
+        repository.size_cache.clear()
+        snapshot = self.repo.snapshot()
+        blob = snapshot.open("foo.txt").load()
+        self.assertEqual(snapshot.read_sizes([blob.hex]), {blob.hex: blob.size})
+        self.assertEqual(repository.size_cache.misses, 1)
+        self.assertEqual(snapshot.read_sizes([blob.hex]), {blob.hex: blob.size})
+        self.assertEqual(repository.size_cache.hits, 1)
+
+    def test_consistent(self):
+        snapshot = self.repo.snapshot()
+        session = self.repo.write_session()
+        session.remove("foo.txt")
+        session.commit("Remove foo.txt")
+
+        # The snapshot still sees the former commit
+        self.assertNotEqual(snapshot.commit.id, self.repo.head.target)
+        self.assertEqual(snapshot.open("foo.txt").data, b"foo\n")
+        self.assertRaises(KeyError, self.repo.open, "foo.txt")
+
+        pinned = self.repo.snapshot(snapshot.commit.id)
+        self.assertEqual(pinned.tree.id, snapshot.tree.id)
+
+
+class LazyObjectTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = repository.Repository()
+
+    def test_blob(self):
+        git_obj = self.repo.open("foo/bar/baz/qux.txt")
+        self.assertEqual(git_obj.name, "qux.txt")
+        self.assertEqual(git_obj.type_str, "blob")
+        self.assertEqual(git_obj.size, 4)
+        self.assertEqual(git_obj.id, pygit2.Oid(hex=git_obj.hex))
+        self.assertFalse(git_obj.is_loaded)
+
+        self.assertEqual(git_obj.data, b"qux\n")
+        self.assertTrue(git_obj.is_loaded)
+        self.assertIn("blob", repr(git_obj))
+
+        # Not a pygit2 object, the real one for the buffer protocol or isinstance
+        self.assertNotIsInstance(git_obj, pygit2.Blob)
+        self.assertRaises(TypeError, memoryview, git_obj)
+        blob = git_obj.load()
+        self.assertIsInstance(blob, pygit2.Blob)
+        with memoryview(blob) as data:
+            self.assertEqual(data.tobytes(), b"qux\n")
+
+    def test_tree(self):
+        git_obj = self.repo.open("foo/bar")
+        self.assertEqual(git_obj.type, pygit2.GIT_OBJ_TREE)
+        self.assertIn("baz", git_obj)
+        self.assertEqual(git_obj["baz"].name, "baz")
+        self.assertEqual([entry.name for entry in git_obj], ["baz"])
+
+        root = self.repo.open("")
+        self.assertTrue(root.is_loaded)
+        self.assertEqual(root.size, 0)
+
+    def test_read_header_loose(self):
+        blob = self.repo.open("foo.txt").load()
+        self.assertEqual(
+            repository.read_header(self.repo, blob.id),
+            (pygit2.GIT_OBJ_BLOB, blob.size),
+        )
+
+    def test_read_header_packed(self):
+        blob = self.repo.open("foo.txt").load()
+        objects = os.path.join(self.repo.path, "objects")
+        os.makedirs(os.path.join(objects, "pack"), exist_ok=True)
+        self.repo.pack()
+        for name in os.listdir(objects):
+            if len(name) == 2:
+                shutil.rmtree(os.path.join(objects, name))
+
+        repo = repository.Repository()
+        self.assertEqual(
+            repository.read_header(repo, blob.hex), (pygit2.GIT_OBJ_BLOB, blob.size)
+        )
+
+    def test_object_database(self):
+        blob = self.repo.open("foo.txt").load()
+        repository.read_header(self.repo, blob.hex)
+        database = repository.object_database(self.repo)
+        # Kept open with the repository, not per object
+        repository.read_sizes(self.repo, [blob.hex])
+        self.assertIs(repository.object_database(self.repo), database)
+        self.assertIsNot(repository.object_database(repository.Repository()), database)
@@ -0,0 +1,341 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from gitstorage import factories
+from gitstorage import models
+from gitstorage import permissions
+from gitstorage import repository
+from gitstorage import search
+from gitstorage.tests.utils import VanillaRepositoryMixin
+
+
+class FoldTestCase(TestCase):
+    def test_fold(self):
+        self.assertEqual(search.fold("D\u00e9p\u00f4t.TXT"), "depot.txt")
+        # Decomposed as stored by some filesystems
+        self.assertEqual(search.fold("de\u0301po\u0302t.txt"), "depot.txt")
+        self.assertEqual(search.fold("Straße"), "strasse")
+        self.assertEqual(search.fold("\ufb01le"), "file")
+
+    def test_terms(self):
+        self.assertEqual(
+            search.terms("Le D\u00e9p\u00f4t, le d\u00e9p\u00f4t: a_b c " + "x" * 65),
+            {"le", "depot", "a_b"},
+        )
+
+    def test_is_indexable(self):
+        self.assertTrue(search.is_indexable("text/plain", 100))
+        self.assertFalse(search.is_indexable("image/png", 100))
+        self.assertFalse(search.is_indexable("text/plain", 2 * 1024 * 1024))
+        self.assertFalse(search.is_indexable("text/plain", None))
+        with self.settings(GITSTORAGE_CONTENT_INDEX_MIMETYPES=["application/json"]):
+            self.assertTrue(search.is_indexable("application/json", 100))
+            self.assertFalse(search.is_indexable("text/plain", 100))
+
+    def test_decode(self):
+        self.assertEqual(search.decode("d\u00e9p\u00f4t".encode()), "d\u00e9p\u00f4t")
+        self.assertIsNone(search.decode(b"\x89PNG\0\0"))
+
+
+class SearchTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        call_command("rebuild_metadata", stdout=StringIO())
+        self.user = factories.UserFactory()
+
+    def paths(self, queryset):
+        return [metadata.path for metadata in queryset]
+
+    def index(self, *paths):
+        return permissions.PermissionIndex(paths)
+
+    def test_prefix(self):
+        self.assertEqual(
+            self.paths(models.PathMetadata.objects.search("FOO")),
+            ["foo", "foo.txt"],
+        )
+        self.assertEqual(
+            self.paths(models.PathMetadata.objects.search("depot")),
+            ["path/with/unicode/de\u0301po\u0302t.txt"],
+        )
+        self.assertEqual(self.paths(models.PathMetadata.objects.search("oo")), [])
+
+    def test_substring(self):
+        self.assertEqual(
+            self.paths(models.PathMetadata.objects.search("ÔT.", search.SUBSTRING)),
+            ["path/with/unicode/de\u0301po\u0302t.txt"],
+        )
+        self.assertEqual(
+            self.paths(models.PathMetadata.objects.search(".tx", search.SUBSTRING)),
+            [
+                "path/with/unicode/de\u0301po\u0302t.txt",
+                "foo.txt",
+                "foo/bar/baz/qux.txt",
+            ],
+        )
+        # Every trigram is in "foo.txt", not the query
+        self.assertEqual(
+            self.paths(models.PathMetadata.objects.search("foo.tx", search.SUBSTRING)),
+            ["foo.txt"],
+        )
+        self.assertEqual(
+            self.paths(models.PathMetadata.objects.search("txtfoo", search.SUBSTRING)),
+            [],
+        )
+        # Wildcards are escaped
+        self.assertEqual(
+            self.paths(models.PathMetadata.objects.search("%%%", search.SUBSTRING)), []
+        )
+
+    def test_substring_short(self):
+        # Shorter than a trigram, prefixes only
+        self.assertEqual(
+            self.paths(models.PathMetadata.objects.search("oo", search.SUBSTRING)), []
+        )
+        self.assertEqual(
+            self.paths(models.PathMetadata.objects.search("FO", search.SUBSTRING)),
+            ["foo", "foo.txt"],
+        )
+
+    def test_trigrams(self):
+        self.assertEqual(
+            search.trigrams("foo.txt"), {"foo", "oo.", "o.t", ".tx", "txt"}
+        )
+        self.assertEqual(search.trigrams("fo"), set())
+        self.assertEqual(
+            set(
+                models.NameTrigram.objects.filter(folded_name="foo").values_list(
+                    "trigram", flat=True
+                )
+            ),
+            {"foo"},
+        )
+
+    def test_substring_synced(self):
+        repo = repository.Repository()
+        old = repo.head.target.hex
+        session = repo.write_session()
+        session.add("Reports/Quarterly.pdf", b"pdf")
+        call_command(
+            "sync_blobs",
+            "refs/heads/master",
+            old,
+            session.commit("Reports").hex,
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            self.paths(models.PathMetadata.objects.search("TERLY", search.SUBSTRING)),
+            ["Reports/Quarterly.pdf"],
+        )
+
+    def test_visible(self):
+        results = models.PathMetadata.objects.search("", search.SUBSTRING)
+        self.assertEqual(
+            self.paths(results.visible(self.index(("foo/bar", "baz", False)))),
+            ["foo/bar/baz", "foo/bar/baz/qux.txt"],
+        )
+        # The root lists its blobs, trees must be allowed themselves
+        self.assertEqual(
+            self.paths(results.visible(self.index((".", "", False)))), ["foo.txt"]
+        )
+        self.assertEqual(
+            self.paths(results.visible(self.index(("path", "with", True)))),
+            [
+                "path/with/hidden/.directory",
+                "path/with/hidden/.directory/.empty",
+                "path/with/hidden/.file",
+                "path/with/unicode/de\u0301po\u0302t.txt",
+                "path/with/hidden",
+                "path/with/unicode",
+                "path/with",
+            ],
+        )
+        self.assertEqual(
+            results.visible(self.index((".", "", True))).count(),
+            models.PathMetadata.objects.count(),
+        )
+        self.assertEqual(
+            results.visible(permissions.PermissionIndex(None)).count(),
+            models.PathMetadata.objects.count(),
+        )
+        self.assertEqual(self.paths(results.visible(self.index())), [])
+
+    def test_visible_case_sensitive(self):
+        repo = repository.Repository()
+        old = repo.head.target.hex
+        session = repo.write_session()
+        session.add("Photos/public.txt", b"public")
+        session.add("photos/secret.txt", b"secret")
+        session.add("PHOTOS/x.txt", b"x")
+        call_command(
+            "sync_blobs",
+            "refs/heads/master",
+            old,
+            session.commit("Photos").hex,
+            stdout=StringIO(),
+        )
+        index = self.index(("Photos", "", True))
+        self.assertFalse(index.is_allowed("photos"))
+        results = models.PathMetadata.objects.search("", search.SUBSTRING)
+        self.assertEqual(
+            self.paths(results.visible(index)), ["Photos", "Photos/public.txt"]
+        )
+        self.assertEqual(
+            self.paths(models.PathMetadata.objects.in_subtree("Photos")),
+            ["Photos/public.txt"],
+        )
+
+    def test_single_query(self):
+        models.TreePermission.objects.grant([self.user], ["foo/bar/baz"])
+        with self.assertNumQueries(2):
+            index = models.TreePermission.objects.index(self.user)
+            results = self.paths(
+                models.PathMetadata.objects.search("qux").visible(index)
+            )
+        self.assertEqual(results, ["foo/bar/baz/qux.txt"])
+
+    def test_prefix_plan(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite query plan")
+        plan = models.PathMetadata.objects.search("foo").explain()
+        self.assertIn("INDEX gitstorage_pathmetadata_folded_name", plan)
+
+    def test_substring_plan(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite query plan")
+        plan = models.PathMetadata.objects.search(
+            "quarterly", search.SUBSTRING
+        ).explain()
+        self.assertIn("INDEX gitstorage_pathmetadata_folded_name", plan)
+        self.assertIn("INDEX sqlite_autoindex_gitstorage_nametrigram", plan)
+        self.assertNotIn("SCAN", plan)
+
+
+class ContentIndexTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = repository.Repository()
+        self.old = self.repo.head.target.hex
+        call_command("rebuild_metadata", stdout=StringIO())
+
+    def push(self, added=(), removed=()):
+        session = self.repo.write_session()
+        for path in removed:
+            session.remove(path)
+        for path, data in added:
+            session.add(path, data)
+        new = session.commit("Push").hex
+        call_command(
+            "sync_blobs", "refs/heads/master", self.old, new, stdout=StringIO()
+        )
+
+    def index(self):
+        stdout = StringIO()
+        call_command("index_content", stdout=stdout)
+        return stdout.getvalue()
+
+    def paths(self, text):
+        return [
+            metadata.path
+            for metadata in models.PathMetadata.objects.search(text, search.CONTENT)
+        ]
+
+    def test_queued(self):
+        # Text blobs only, hidden empty files have no mimetype
+        self.assertEqual(
+            sorted(models.IndexedBlob.objects.pending().values_list("pk", flat=True)),
+            [
+                "100b0dec8c53a40e4de7714b2c612dad5fad9985",
+                "257cc5642cb1a054f08cc83f2d943e56fd3ebe99",
+                "96a3eaf942db42de1abf62639f1f8fc536eb4eb0",
+            ],
+        )
+        self.assertEqual(self.index(), "3 blobs indexed, 0 pruned, 0 pending\n")
+        self.assertEqual(self.paths("FOO"), ["foo.txt"])
+        self.assertEqual(
+            self.paths("depot"), ["path/with/unicode/de\u0301po\u0302t.txt"]
+        )
+        self.assertEqual(self.paths("unknown"), [])
+        self.assertEqual(self.paths("!"), [])
+
+    def test_deduplicated(self):
+        self.push(
+            added=[
+                ("copy.txt", b"Some text here\n"),
+                ("other/copy.md", b"Some text here\n"),
+                ("large.txt", b"large " * 1024),
+                ("binary.txt", b"\0binary"),
+            ]
+        )
+        self.assertEqual(models.IndexedBlob.objects.pending().count(), 6)
+        with override_settings(GITSTORAGE_CONTENT_INDEX_MAX_SIZE=1024):
+            self.push(added=[("larger.txt", b"larger " * 1024)])
+        self.assertEqual(models.IndexedBlob.objects.pending().count(), 6)
+
+        self.index()
+        self.assertEqual(self.paths("text some"), ["other/copy.md", "copy.txt"])
+        self.assertEqual(self.paths("text foo"), [])
+        self.assertEqual(self.paths("large"), ["large.txt"])
+        self.assertEqual(self.paths("binary"), [])
+        self.assertEqual(models.ContentTerm.objects.filter(term="text").count(), 1)
+        self.assertEqual(
+            models.IndexedBlob.objects.filter(
+                status=models.IndexedBlob.SKIPPED
+            ).count(),
+            1,
+        )
+
+    def test_resumable(self):
+        self.assertEqual(
+            models.IndexedBlob.objects.index_batch(self.repo, batch_size=2), 2
+        )
+        self.assertEqual(models.IndexedBlob.objects.pending().count(), 1)
+        stdout = StringIO()
+        call_command("index_content", limit=1, batch_size=1, stdout=stdout)
+        self.assertEqual(stdout.getvalue(), "1 blobs indexed, 0 pruned, 0 pending\n")
+        self.assertEqual(
+            models.IndexedBlob.objects.index_batch(self.repo, batch_size=2), 0
+        )
+
+    def test_pruned(self):
+        self.index()
+        self.push(removed=["foo.txt"])
+        self.assertEqual(self.index(), "0 blobs indexed, 1 pruned, 0 pending\n")
+        self.assertFalse(models.ContentTerm.objects.filter(term="foo").exists())
+
+    def test_visible(self):
+        self.index()
+        index = permissions.PermissionIndex([("foo/bar", "baz", False)])
+        self.assertEqual(
+            [
+                metadata.path
+                for metadata in models.PathMetadata.objects.search(
+                    "qux", search.CONTENT
+                ).visible(index)
+            ],
+            ["foo/bar/baz/qux.txt"],
+        )
+        self.assertEqual(
+            models.PathMetadata.objects.search("foo", search.CONTENT)
+            .visible(index)
+            .count(),
+            0,
+        )
@@ -0,0 +1,219 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+
+from gitstorage import repository
+from gitstorage import spool
+from gitstorage.tests.utils import VanillaRepositoryMixin
+
+
+class CountingObject(object):
+    """Blob stand-in counting how many times it is loaded."""
+
+    def __init__(self, blob, delay=0, hex=None):
+        self.hex = hex or blob.hex
+        self.blob = blob
+        self.delay = delay
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        time.sleep(self.delay)
+        return self.blob
+
+
+class BlobSpoolTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = repository.Repository()
+        self.root = tempfile.mkdtemp("gitstorage-spool")
+        self.spool = spool.BlobSpool(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        super().tearDown()
+
+    def test_fill(self):
+        git_obj = self.repo.open("foo/bar/baz/qux.txt")
+        path = self.spool.fill(git_obj)
+        self.assertEqual(
+            path, os.path.join(self.root, git_obj.hex[:2], git_obj.hex[2:])
+        )
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"qux\n")
+        # No temporary file left
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(path))),
+            [git_obj.hex[2:], git_obj.hex[2:] + ".lock"],
+        )
+
+    def test_fill_once(self):
+        git_obj = CountingObject(self.repo.open("foo.txt").load())
+        path = self.spool.fill(git_obj)
+        os.utime(path, (0, 0))
+        self.assertEqual(self.spool.fill(git_obj), path)
+        self.assertEqual(git_obj.loads, 1)
+        # Marked as recently used
+        self.assertGreater(os.stat(path).st_mtime, 0)
+
+    def test_concurrent_fill(self):
+        git_obj = CountingObject(self.repo.open("foo.txt").load(), delay=0.1)
+        threads = [
+            threading.Thread(target=self.spool.fill, args=[git_obj]) for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(git_obj.loads, 1)
+
+    def test_failed_write(self):
+        git_obj = CountingObject(None, hex="0" * 40)
+        self.assertRaises(TypeError, self.spool.fill, git_obj)
+        self.assertEqual(
+            os.listdir(os.path.join(self.root, "00")), ["0" * 38 + ".lock"]
+        )
+
+    def test_evict(self):
+        self.spool.max_size = 13
+        foo = self.spool.fill(self.repo.open("foo.txt"))
+        os.utime(foo, (1, 1))
+        qux = self.spool.fill(self.repo.open("foo/bar/baz/qux.txt"))
+        os.utime(qux, (2, 2))
+        # 4 + 4 bytes, still fits
+        self.assertTrue(os.path.exists(foo))
+
+        # 9 more bytes, the least recently used is evicted
+        depot = self.spool.fill(
+            self.repo.open("path/with/unicode/de\u0301po\u0302t.txt")
+        )
+        self.assertFalse(os.path.exists(foo))
+        self.assertTrue(os.path.exists(qux))
+        self.assertTrue(os.path.exists(depot))
+
+    def test_evict_filled(self):
+        self.spool.max_size = 10
+        foo = self.spool.fill(self.repo.open("foo.txt"))
+        # 4 + 9 bytes, the file just filled is never evicted
+        depot = self.spool.fill(
+            self.repo.open("path/with/unicode/de\u0301po\u0302t.txt")
+        )
+        self.assertFalse(os.path.exists(foo))
+        self.assertTrue(os.path.exists(depot))
+
+    def test_evict_lock(self):
+        self.spool.max_size = 10
+        foo = self.spool.fill(self.repo.open("foo.txt"))
+        os.utime(foo, (1, 1))
+        self.spool.fill(self.repo.open("path/with/unicode/de\u0301po\u0302t.txt"))
+        # The lock file is removed with the evicted file
+        self.assertFalse(os.path.exists(foo))
+        self.assertFalse(os.path.exists(foo + ".lock"))
+
+    def test_evict_written_only(self):
+        self.spool.max_size = 10
+        git_obj = self.repo.open("foo.txt")
+        self.spool.fill(git_obj)
+        evicted = []
+        self.spool.evict = lambda keep=None: evicted.append(keep)
+        # Already spooled, the spool is not scanned
+        self.spool.fill(git_obj)
+        self.spool.open_file(git_obj).close()
+        self.assertEqual(evicted, [])
+        # A new file is written
+        path = self.spool.fill(self.repo.open("foo/bar/baz/qux.txt"))
+        self.assertEqual(evicted, [path])
+
+    def test_larger_than_spool(self):
+        self.spool.max_size = 10
+        self.assertTrue(self.spool.fits(10))
+        self.assertFalse(self.spool.fits(100))
+        self.assertTrue(spool.BlobSpool(self.root).fits(100))
+        session = self.repo.write_session()
+        session.add("large.bin", b"x" * 100)
+        session.commit("Large file")
+        path = self.spool.fill(self.repo.open("large.bin"))
+        self.assertTrue(os.path.exists(path))
+
+    def test_open_file(self):
+        self.spool.max_size = 10
+        foo = self.spool.fill(self.repo.open("foo.txt"))
+        os.utime(foo, (1, 1))
+        git_obj = self.repo.open("path/with/unicode/de\u0301po\u0302t.txt")
+        with self.spool.open_file(git_obj) as f:
+            self.assertEqual(f.read(), "de\u0301po\u0302t".encode())
+            # Evicted after opening
+            self.assertFalse(os.path.exists(foo))
+
+    def test_evicted_during_fill(self):
+        git_obj = self.repo.open("foo.txt")
+        fill = self.spool._fill
+        evicted = []
+
+        def fill_evicted(git_obj):
+            # Another worker evicts the file before it is opened, once
+            path, written = fill(git_obj)
+            if not evicted:
+                os.unlink(path)
+                evicted.append(path)
+            return path, written
+
+        self.spool._fill = fill_evicted
+        with self.spool.open_file(git_obj) as f:
+            self.assertEqual(f.read(), b"foo\n")
+        self.assertEqual(len(evicted), 1)
+
+    def test_evicted_always(self):
+        git_obj = self.repo.open("foo.txt")
+        fill = self.spool._fill
+
+        def fill_evicted(git_obj):
+            path, written = fill(git_obj)
+            os.unlink(path)
+            return path, written
+
+        self.spool._fill = fill_evicted
+        self.assertRaises(FileNotFoundError, self.spool.open_file, git_obj)
+
+    def test_iter_file(self):
+        path = self.spool.fill(
+            self.repo.open("path/with/unicode/de\u0301po\u0302t.txt")
+        )
+        self.assertEqual(
+            list(spool.iter_file(path, 0, 9, chunk_size=4)),
+            [b"de\xcc\x81", b"po\xcc\x82", b"t"],
+        )
+        self.assertEqual(list(spool.iter_file(path, 2, 4)), [b"\xcc\x81"])
+        # Truncated file
+        self.assertEqual(b"".join(spool.iter_file(path, 6, 20)), b"\xcc\x82t")
+        # Open file
+        f = open(path, "rb")
+        self.assertEqual(b"".join(spool.iter_file(f, 6, 9)), b"\xcc\x82t")
+        self.assertTrue(f.closed)
+
+    def test_get_spool(self):
+        with self.settings(GITSTORAGE_SPOOL_ROOT=None):
+            self.assertRaises(ImproperlyConfigured, spool.get_spool)
+        with self.settings(GITSTORAGE_SPOOL_ROOT=self.root):
+            self.assertIs(spool.get_spool(), spool.get_spool())
+            self.assertEqual(spool.get_spool().root, self.root)
@@ -0,0 +1,351 @@
+# This file is part of django-gitstorage.
+#
+#    Django-gitstorage is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Django-gitstorage is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
+
+from io import StringIO
+from pathlib import PurePath
+
+import pygit2
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from gitstorage import factories
+from gitstorage import models
+from gitstorage import repository
+from gitstorage import signals
+from gitstorage import sync
+from gitstorage.tests.utils import VanillaRepositoryMixin
+
+
+class SyncTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = repository.Repository()
+        self.old = self.repo.head.target.hex
+
+    def commit(self, added=(), removed=()):
+        session = self.repo.write_session()
+        for path in removed:
+            session.remove(path)
+        for path, data in added:
+            session.add(path, data)
+        return session.commit("Push").hex
+
+    def diff(self, new):
+        return {
+            (change.status, str(change.old_path), str(change.new_path))
+            for change in sync.diff_commits(self.repo, self.old, new)
+        }
+
+    def test_unchanged(self):
+        self.assertEqual(sync.diff_commits(self.repo, self.old, self.old), [])
+
+    def test_added_modified_deleted(self):
+        new = self.commit(
+            added=[("foo.txt", b"changed\n"), ("path/new.txt", b"new\n")],
+            removed=["path/with/unicode/de\u0301po\u0302t.txt"],
+        )
+        self.assertEqual(
+            self.diff(new),
+            {
+                (sync.MODIFIED, "foo.txt", "foo.txt"),
+                (sync.MODIFIED, "path", "path"),
+                (sync.ADDED, "None", "path/new.txt"),
+                (sync.MODIFIED, "path/with", "path/with"),
+                (sync.DELETED, "path/with/unicode", "None"),
+                (sync.DELETED, "path/with/unicode/de\u0301po\u0302t.txt", "None"),
+            },
+        )
+
+    def test_unchanged_subtrees_skipped(self):
+        new = self.commit(added=[("foo.txt", b"changed\n")])
+        read = []
+        tree_entries = sync.tree_entries
+
+        def spy(repo, tree_hex):
+            read.append(tree_hex)
+            return tree_entries(repo, tree_hex)
+
+        sync.tree_entries = spy
+        try:
+            sync.diff_commits(self.repo, self.old, new)
+        finally:
+            sync.tree_entries = tree_entries
+        # Only the root trees
+        self.assertEqual(len(read), 2)
+
+    def test_renamed(self):
+        new = self.commit(
+            added=[("moved/bar/baz/qux.txt", b"qux\n")],
+            removed=["foo/bar/baz/qux.txt"],
+        )
+        changes = sync.diff_commits(self.repo, self.old, new)
+        self.assertEqual(
+            {(change.status, str(change.path)) for change in changes},
+            {
+                (sync.RENAMED, "moved"),
+                (sync.RENAMED, "moved/bar"),
+                (sync.RENAMED, "moved/bar/baz"),
+                (sync.RENAMED, "moved/bar/baz/qux.txt"),
+            },
+        )
+        renamed = changes[0]
+        self.assertEqual(renamed.old_path, PurePath("foo"))
+        self.assertEqual(renamed.type, pygit2.GIT_OBJ_TREE)
+
+    def test_renamed_same_name(self):
+        new = self.commit(
+            added=[("other/.file", b""), ("other/.empty", b"")],
+            removed=["path/with/hidden/.file"],
+        )
+        renamed = [
+            change
+            for change in sync.diff_commits(self.repo, self.old, new)
+            if change.status == sync.RENAMED
+        ]
+        self.assertEqual(len(renamed), 1)
+        self.assertEqual(renamed[0].old_path, PurePath("path/with/hidden/.file"))
+        self.assertEqual(renamed[0].new_path, PurePath("other/.file"))
+
+    def test_type_changed(self):
+        new = self.commit(
+            added=[("foo.txt/inside.txt", b"inside\n")], removed=["foo.txt"]
+        )
+        self.assertEqual(
+            self.diff(new),
+            {
+                (sync.DELETED, "foo.txt", "None"),
+                (sync.ADDED, "None", "foo.txt"),
+                (sync.ADDED, "None", "foo.txt/inside.txt"),
+            },
+        )
+
+    def test_new_branch(self):
+        changes = sync.diff_commits(self.repo, sync.NULL_HEX, self.old)
+        self.assertEqual(len(changes), 13)
+        self.assertEqual({change.status for change in changes}, {sync.ADDED})
+
+    def test_batches(self):
+        batches = []
+
+        def receiver(sender, changes, **kwargs):
+            batches.append(len(changes))
+
+        signals.changes_synced.connect(receiver)
+        try:
+            sync.sync(self.repo, sync.NULL_HEX, self.old, batch_size=5)
+        finally:
+            signals.changes_synced.disconnect(receiver)
+        self.assertEqual(batches, [5, 5, 3])
+
+
+class SyncPermissionsTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = repository.Repository()
+        self.old = self.repo.head.target.hex
+        self.user = factories.UserFactory()
+
+    def push(self, added=(), removed=()):
+        session = self.repo.write_session()
+        for path in removed:
+            session.remove(path)
+        for path, data in added:
+            session.add(path, data)
+        new = session.commit("Push").hex
+        call_command(
+            "sync_blobs", "refs/heads/master", self.old, new, stdout=StringIO()
+        )
+
+    def paths(self):
+        return sorted(models.TreePermission.objects.values_list("path", flat=True))
+
+    def test_renamed(self):
+        models.TreePermission.objects.grant([self.user], ["foo", "foo/bar/baz"])
+        models.TreePermission.objects.grant([self.user], ["path"])
+        self.push(
+            added=[("moved/bar/baz/qux.txt", b"qux\n")],
+            removed=["foo/bar/baz/qux.txt"],
+        )
+        self.assertEqual(self.paths(), ["moved", "moved/bar/baz", "path"])
+        permission = models.TreePermission.objects.get(path="moved/bar/baz")
+        self.assertEqual(permission.parent_path, "moved/bar")
+        self.assertEqual(permission.name, "baz")
+        self.assertTrue(
+            models.TreePermission.objects.is_allowed(self.user, PurePath("moved"))
+        )
+
+    def test_case_sensitive(self):
+        models.TreePermission.objects.grant([self.user], ["Foo", "foo/bar", "Foo-x"])
+        models.TreePermission.objects.move("Foo", "Baz")
+        self.assertEqual(self.paths(), ["Baz", "Foo-x", "foo/bar"])
+        models.TreePermission.objects.in_subtree("Baz").delete()
+        self.assertEqual(self.paths(), ["Foo-x", "foo/bar"])
+
+    def test_renamed_case(self):
+        models.TreePermission.objects.grant([self.user], ["FOO", "foo/bar"])
+        self.push(
+            added=[("moved/bar/baz/qux.txt", b"qux\n")],
+            removed=["foo/bar/baz/qux.txt"],
+        )
+        self.assertEqual(self.paths(), ["FOO", "moved/bar"])
+
+    def test_deleted(self):
+        models.TreePermission.objects.grant(
+            [self.user], ["path", "path/with/hidden", "path/with/hidden/.directory"]
+        )
+        self.push(
+            removed=["path/with/hidden/.file", "path/with/hidden/.directory/.empty"]
+        )
+        self.assertEqual(self.paths(), ["path"])
+
+    def test_other_branch(self):
+        models.TreePermission.objects.grant([self.user], ["foo"])
+        session = self.repo.write_session()
+        session.remove("foo/bar/baz/qux.txt")
+        new = session.commit("Push").hex
+        stdout = StringIO()
+        call_command(
+            "sync_blobs",
+            "refs/heads/other",
+            self.old,
+            new,
+            verbosity=2,
+            stdout=stdout,
+        )
+        self.assertIn("skipped", stdout.getvalue())
+        self.assertEqual(self.paths(), ["foo"])
+
+    def test_verbosity(self):
+        session = self.repo.write_session()
+        session.add("foo.txt", b"changed\n")
+        new = session.commit("Push").hex
+        stdout = StringIO()
+        call_command(
+            "sync_blobs",
+            "refs/heads/master",
+            self.old,
+            new,
+            verbosity=2,
+            stdout=stdout,
+        )
+        self.assertEqual(
+            stdout.getvalue(), "0 added, 1 modified, 0 deleted, 0 renamed\n"
+        )
+
+
+class PathMetadataTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.repo = repository.Repository()
+        self.old = self.repo.head.target.hex
+        call_command("rebuild_metadata", stdout=StringIO())
+
+    def push(self, added=(), removed=()):
+        session = self.repo.write_session()
+        for path in removed:
+            session.remove(path)
+        for path, data in added:
+            session.add(path, data)
+        new = session.commit("Push").hex
+        call_command(
+            "sync_blobs", "refs/heads/master", self.old, new, stdout=StringIO()
+        )
+
+    def assertVerified(self):
+        self.assertEqual(models.PathMetadata.objects.verify(self.repo), ([], [], []))
+
+    def test_rebuild(self):
+        self.assertEqual(models.PathMetadata.objects.count(), 13)
+        self.assertVerified()
+        blob = models.PathMetadata.objects.get(path="foo/bar/baz/qux.txt")
+        self.assertEqual(blob.parent_path, "foo/bar/baz")
+        self.assertEqual(blob.name, "qux.txt")
+        self.assertEqual(blob.hex, "100b0dec8c53a40e4de7714b2c612dad5fad9985")
+        self.assertEqual(blob.type, pygit2.GIT_OBJ_BLOB)
+        self.assertEqual(blob.size, 4)
+        self.assertEqual(blob.mimetype, "text/plain")
+        tree = models.PathMetadata.objects.get(path="foo")
+        self.assertEqual(tree.parent_path, ".")
+        self.assertIsNone(tree.size)
+        self.assertEqual(tree.mimetype, "")
+
+    def test_children(self):
+        self.assertEqual(
+            [
+                (entry.name, entry.type)
+                for entry in models.PathMetadata.objects.children(".")
+            ],
+            [
+                ("foo", pygit2.GIT_OBJ_TREE),
+                ("foo.txt", pygit2.GIT_OBJ_BLOB),
+                ("path", pygit2.GIT_OBJ_TREE),
+            ],
+        )
+        entry = models.PathMetadata.objects.get(path="foo.txt").to_entry()
+        self.assertEqual(entry.path, "foo.txt")
+        self.assertEqual(entry.size, 4)
+        self.assertEqual(entry.mimetype, "text/plain")
+
+    def test_in_subtree(self):
+        self.assertEqual(
+            models.PathMetadata.objects.in_subtree("path/with/hidden").count(), 3
+        )
+        self.assertEqual(models.PathMetadata.objects.in_subtree(".").count(), 13)
+
+    def test_push(self):
+        self.push(
+            added=[
+                ("foo.txt", b"changed\n"),
+                ("moved/bar/baz/qux.txt", b"qux\n"),
+                ("path/new.pdf", b"new"),
+            ],
+            removed=["foo/bar/baz/qux.txt", "path/with/unicode/de\u0301po\u0302t.txt"],
+        )
+        self.assertVerified()
+        self.assertEqual(models.PathMetadata.objects.get(path="foo.txt").size, 8)
+        self.assertEqual(
+            models.PathMetadata.objects.get(path="path/new.pdf").mimetype,
+            "application/pdf",
+        )
+        self.assertFalse(models.PathMetadata.objects.filter(path="foo").exists())
+
+    def test_apply_twice(self):
+        session = self.repo.write_session()
+        session.add("path/new.txt", b"new")
+        new = session.commit("Push").hex
+        changes = sync.diff_commits(self.repo, self.old, new)
+        models.PathMetadata.objects.apply(self.repo, changes)
+        models.PathMetadata.objects.apply(self.repo, changes)
+        self.assertVerified()
+
+    def test_verify(self):
+        models.PathMetadata.objects.filter(path="foo.txt").delete()
+        models.PathMetadata.objects.filter(path="foo").update(hex="0" * 40)
+        models.PathMetadata.objects.create(
+            parent_path=".", name="extra", path="extra", hex="0" * 40, type=2
+        )
+        self.assertEqual(
+            models.PathMetadata.objects.verify(self.repo),
+            (["foo.txt"], ["extra"], ["foo"]),
+        )
+        stdout = StringIO()
+        with self.assertRaisesMessage(CommandError, "1 missing, 1 extra, 1 stale"):
+            call_command("rebuild_metadata", verify=True, verbosity=2, stdout=stdout)
+        self.assertEqual(stdout.getvalue(), "missing foo.txt\nextra extra\nstale foo\n")
+
+        call_command("rebuild_metadata", stdout=stdout)
+        call_command("rebuild_metadata", verify=True, stdout=stdout)
+        self.assertVerified()
@@ -13,11 +13,18 @@
 #    You should have received a copy of the GNU General Public License
 #    along with django-gitstorage.  If not, see <http://www.gnu.org/licenses/>.
 
+from io import StringIO
+import operator
+import os
 from pathlib import Path
+import tracemalloc
+from unittest import mock
 
 import pygit2
 
-from django.core.exceptions import PermissionDenied
+from django.contrib.auth import models as auth_models
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.core.management import call_command
 from django.urls import reverse
 from django.http.response import Http404
 from django.test import TestCase
@@ -76,6 +83,330 @@ class DownloadViewTestCase(BaseViewTestCase):
         )
 
 
+class StreamingDownloadTestCase(BaseViewTestCase):
+    path = "foo/bar/baz/qux.txt"
+    size = 4 * 1024 * 1024
+
+    def setUp(self):
+        super().setUp()
+        session = self.repo.write_session()
+        session.add("foo/bar/baz/large.bin", b"x" * self.size)
+        session.commit("Large file")
+        self.url = reverse("blob_download", args=["foo/bar/baz/large.bin"])
+
+    def download_peak(self):
+        """Peak of memory allocated by Python while downloading the large file."""
+        tracemalloc.start()
+        try:
+            response = self.client.get(self.url)
+            length = sum(len(chunk) for chunk in response)
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Length"], str(self.size))
+        self.assertEqual(length, self.size)
+        return peak
+
+    def test_stream(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/octet-stream")
+        self.assertEqual(b"".join(response.streaming_content), b"x" * self.size)
+
+    def test_peak_memory(self):
+        self.assertLess(self.download_peak(), self.size / 4)
+
+        with self.settings(GITSTORAGE_DOWNLOAD_BACKEND="memory"):
+            self.assertGreater(self.download_peak(), self.size)
+
+    def test_unknown_backend(self):
+        with self.settings(GITSTORAGE_DOWNLOAD_BACKEND="unknown"):
+            self.assertRaises(ImproperlyConfigured, self.client.get, self.url)
+
+
+class OffloadDownloadTestCase(BaseViewTestCase):
+    path = "foo/bar/baz/qux.txt"
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("blob_download", args=[self.path])
+        self.spool_root = os.path.join(self.tempdir, "spool")
+        self.relative_path = f"{self.git_obj.hex[:2]}/{self.git_obj.hex[2:]}"
+
+    def test_x_accel_redirect(self):
+        with self.settings(
+            GITSTORAGE_DOWNLOAD_BACKEND="offload", GITSTORAGE_SPOOL_ROOT=self.spool_root
+        ):
+            response = self.client.get(self.url, HTTP_RANGE="bytes=0-1")
+        # The Web server handles the range
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], f"/gitstorage-spool/{self.relative_path}"
+        )
+        self.assertEqual(response["Content-Type"], "text/plain")
+        self.assertEqual(response["ETag"], f'"{self.git_obj.hex}"')
+        self.assertEqual(response.content, b"")
+        with open(os.path.join(self.spool_root, self.relative_path), "rb") as f:
+            self.assertEqual(f.read(), b"qux\n")
+
+    def test_larger_than_spool(self):
+        with self.settings(
+            GITSTORAGE_DOWNLOAD_BACKEND="offload",
+            GITSTORAGE_SPOOL_ROOT=self.spool_root,
+            GITSTORAGE_SPOOL_MAX_SIZE=2,
+        ):
+            response = self.client.get(self.url)
+        # Streamed, not spooled
+        self.assertNotIn("X-Accel-Redirect", response)
+        self.assertEqual(b"".join(response.streaming_content), b"qux\n")
+        self.assertFalse(
+            os.path.exists(os.path.join(self.spool_root, self.relative_path))
+        )
+
+    def test_x_sendfile(self):
+        with self.settings(
+            GITSTORAGE_DOWNLOAD_BACKEND="offload",
+            GITSTORAGE_SPOOL_ROOT=self.spool_root,
+            GITSTORAGE_OFFLOAD_HEADER="X-Sendfile",
+        ):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response["X-Sendfile"], os.path.join(self.spool_root, self.relative_path)
+        )
+
+
+class FileDownloadTestCase(BaseViewTestCase):
+    path = "foo/bar/baz/qux.txt"
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("blob_download", args=[self.path])
+        self.spool_root = os.path.join(self.tempdir, "spool")
+
+    def test_file(self):
+        with self.settings(
+            GITSTORAGE_DOWNLOAD_BACKEND="file", GITSTORAGE_SPOOL_ROOT=self.spool_root
+        ):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        # Sent by the WSGI server
+        self.assertTrue(hasattr(response, "file_to_stream"))
+        self.assertEqual(response["Content-Type"], "text/plain")
+        self.assertEqual(response["Content-Length"], "4")
+        self.assertTrue(response["Content-Disposition"].startswith("attachment;"))
+        self.assertEqual(b"".join(response.streaming_content), b"qux\n")
+        response.close()
+
+    def test_range(self):
+        with self.settings(
+            GITSTORAGE_DOWNLOAD_BACKEND="file", GITSTORAGE_SPOOL_ROOT=self.spool_root
+        ):
+            response = self.client.get(self.url, HTTP_RANGE="bytes=1-")
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b"".join(response.streaming_content), b"ux\n")
+
+    def test_larger_than_spool(self):
+        with self.settings(
+            GITSTORAGE_DOWNLOAD_BACKEND="file",
+            GITSTORAGE_SPOOL_ROOT=self.spool_root,
+            GITSTORAGE_SPOOL_MAX_SIZE=2,
+        ):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(hasattr(response, "file_to_stream"))
+            self.assertEqual(b"".join(response.streaming_content), b"qux\n")
+
+            response = self.client.get(self.url, HTTP_RANGE="bytes=1-")
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b"".join(response.streaming_content), b"ux\n")
+        self.assertFalse(os.path.exists(self.spool_root))
+
+    def test_evicted(self):
+        models.TreePermission.objects.grant([self.user], [Path("")])
+        with self.settings(
+            GITSTORAGE_DOWNLOAD_BACKEND="file",
+            GITSTORAGE_SPOOL_ROOT=self.spool_root,
+            GITSTORAGE_SPOOL_MAX_SIZE=4,
+        ):
+            other = self.client.get(reverse("blob_download", args=["foo.txt"]))
+            response = self.client.get(self.url)
+            # The first file is evicted while open, still sent
+            self.assertEqual(b"".join(other.streaming_content), b"foo\n")
+            self.assertEqual(b"".join(response.streaming_content), b"qux\n")
+        other.close()
+        response.close()
+
+
+class RangeDownloadTestCase(BaseViewTestCase):
+    path = "foo/bar/baz/qux.txt"
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("blob_inline", args=[self.path])
+
+    def test_full(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_single(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=1-2")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 1-2/4")
+        self.assertEqual(response["Content-Length"], "2")
+        self.assertEqual(response["Content-Type"], "text/plain")
+        self.assertEqual(b"".join(response.streaming_content), b"ux")
+
+    def test_multiple(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-0,-1")
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response["Content-Type"].startswith("multipart/byteranges"))
+        content = b"".join(response.streaming_content)
+        self.assertEqual(response["Content-Length"], str(len(content)))
+        self.assertIn(b"Content-Range: bytes 0-0/4\r\n\r\nq\r\n", content)
+        self.assertIn(b"Content-Range: bytes 3-3/4\r\n\r\n\n\r\n", content)
+
+    def test_overlapping(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-1,1-2")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 0-2/4")
+        self.assertEqual(b"".join(response.streaming_content), b"qux")
+
+    def test_amplification(self):
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=" + ",".join(["0-"] * 64)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"qux\n")
+
+    def test_not_satisfiable(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=4-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */4")
+
+    def test_if_range(self):
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=1-2", HTTP_IF_RANGE='"outdated"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"qux\n")
+
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=1-2", HTTP_IF_RANGE=f'"{self.git_obj.hex}"'
+        )
+        self.assertEqual(response.status_code, 206)
+
+
+class ConditionalDownloadTestCase(BaseViewTestCase):
+    path = "foo/bar/baz/qux.txt"
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("blob_download", args=[self.path])
+        self.etag = f'"{self.git_obj.hex}"'
+
+    def test_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+
+        with self.settings(GITSTORAGE_BLOB_CACHE_CONTROL=None):
+            response = self.client.get(self.url)
+            self.assertNotIn("Cache-Control", response)
+
+    def test_if_none_match(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], self.etag)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"outdated"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_not_loaded(self):
+        request = RequestFactory().get("/", HTTP_IF_NONE_MATCH=self.etag)
+        request.user = self.user
+        view = views.TestDownloadView()
+        view.setup(request)
+        response = view.dispatch(request, path=self.path)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(view.git_obj.is_loaded)
+
+    def test_if_match(self):
+        response = self.client.get(self.url, HTTP_IF_MATCH=self.etag)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, HTTP_IF_MATCH='"outdated"')
+        self.assertEqual(response.status_code, 412)
+
+    def test_denied(self):
+        self.client.logout()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 403)
+
+
+class ConditionalTreeTestCase(BaseViewTestCase):
+    path = "foo/bar/baz"
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("repo_browse", args=[self.path])
+
+    def test_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith(f'W/"{self.git_obj.hex}-'))
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Sharing another tree changes the root trees listed
+        factories.TreePermissionFactory(
+            parent_path=Path("foo").parent, name="foo", user=self.user
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_breadcrumbs(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        # Only the breadcrumbs change, neither the tree nor the root trees listed
+        models.TreePermission.objects.grant([self.user], [Path("foo/bar")])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_other_user(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+
+        user = factories.UserFactory(password="password")
+        factories.TreePermissionFactory(
+            parent_path=self.path.parent, name=self.path.name, user=user
+        )
+        assert self.client.login(username=user.username, password="password")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_opt_in(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        view = views.DummyTreeView()
+        view.setup(request)
+        view.dispatch(request, path=self.path)
+        # Only the bundled tree view answers conditional requests
+        self.assertIsNone(view.get_etag())
+
+    def test_shares_not_conditional(self):
+        response = self.client.get(reverse("tree_shares", args=[self.path]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+
+
 class InlineViewTestCase(BaseViewTestCase):
     path = "path/with/unicode/de\u0301po\u0302t.txt"
 
@@ -149,6 +480,29 @@ class ShareViewTestCase(BaseViewTestCase):
         response = self.client.post(reverse("tree_share", args=[self.path]), data=data)
         self.assertEqual(response.status_code, 200)
 
+    def get_form(self, view_class):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        view = view_class()
+        view.setup(request)
+        view.path = self.path
+        return view.get_form()
+
+    def test_group_granted(self):
+        user = factories.UserFactory()
+        group = auth_models.Group.objects.create(name="group")
+        models.TreePermission.objects.grant([None], [self.path], groups=[group])
+
+        users = self.get_form(views.TestShareView).fields["users"].queryset
+        self.assertIn(user, users)
+        self.assertNotIn(self.user, users)
+        users = self.get_form(views.TestSharesView).fields["users"].queryset
+        self.assertEqual(list(users), [self.user])
+
+        data = {"users": user.pk}
+        response = self.client.post(reverse("tree_share", args=[self.path]), data=data)
+        self.assertEqual(response.status_code, 302)
+
 
 class BlobViewTestCase(BaseViewTestCase):
     path = "foo/bar/baz/qux.txt"
@@ -239,6 +593,42 @@ class TreeViewTestCase(BaseViewTestCase):
         self.assertEqual(blob["name"], "qux.txt")
         self.assertEqual(blob["path"], "foo/bar/baz/qux.txt")
         self.assertEqual(blob["blob"], self.blob)
+        self.assertEqual(blob["size"], self.repo[self.blob.pk].size)
+
+    def test_single_listing(self):
+        superuser = factories.SuperUserFactory(password="password")
+        assert self.client.login(username=superuser.username, password="password")
+        listdir = repository.Snapshot.listdir
+        with mock.patch.object(
+            repository.Snapshot, "listdir", autospec=True, side_effect=listdir
+        ) as mocked:
+            response = self.client.get(reverse("repo_browse", args=[""]))
+        self.assertEqual(response.status_code, 200)
+        # Root trees and trees of the root page share the same listing
+        self.assertEqual(mocked.call_count, 1)
+        self.assertIs(response.context["trees"], response.context["root_trees"])
+
+        with self.assertNumQueries(2):  # Session and user
+            response = self.client.get(reverse("repo_browse", args=[self.path]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_single_permission_query(self):
+        with self.assertNumQueries(3):  # Session, user and permissions
+            response = self.client.get(reverse("repo_browse", args=[self.path]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["allowed_breadcrumbs"], [self.path])
+
+    def test_recursive(self):
+        user = factories.UserFactory(password="password")
+        models.TreePermission.objects.grant([user], [Path("foo")], recursive=True)
+        assert self.client.login(username=user.username, password="password")
+        response = self.client.get(reverse("repo_browse", args=[self.path]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context["allowed_breadcrumbs"], response.context["breadcrumbs"]
+        )
+        response = self.client.get(reverse("repo_browse", args=["foo"]))
+        self.assertEqual([tree.name for tree in response.context["trees"]], ["bar"])
 
     def test_get_hidden(self):
         response = self.client.get(
@@ -266,6 +656,108 @@ class TreeViewTestCase(BaseViewTestCase):
         self.assertEqual(response.status_code, 200)
 
 
+class PaginatedTreeTestCase(BaseViewTestCase):
+    path = "foo/bar/baz"
+
+    def setUp(self):
+        super().setUp()
+        session = self.repo.write_session()
+        for i in range(25):
+            session.add("foo/bar/baz/f{0:02d}.txt".format(i), b"x" * i)
+            session.add("foo/bar/baz/d{0:02d}/file.txt".format(i), b"file")
+        session.add("foo/bar/baz/.hidden", b"hidden")
+        session.commit("Many files")
+        _trees, blobs = self.repo.listdir(self.path)
+        self.names = sorted(blob.name for blob in blobs if blob.name[0] != ".")
+
+    def get_view(self, **params):
+        request = RequestFactory().get("/", params)
+        # Allowed to browse every tree
+        request.user = factories.SuperUserFactory()
+        view = views.TestTreeView(request=request, paginate_by=10)
+        view.repo = self.repo.snapshot()
+        view.path = self.path
+        return view
+
+    def walk(self, **attributes):
+        """Names of the blobs listed page by page, and the pages."""
+        names, pages = [], []
+        params = {}
+        while True:
+            view = self.get_view(**params)
+            for name, value in attributes.items():
+                setattr(view, name, value)
+            page = view.filter_blobs()
+            pages.append(page)
+            names.extend(entry.name for entry in page)
+            if page.next_cursor is None:
+                return names, pages
+            params = {view.blobs_cursor_kwarg: page.next_cursor}
+
+    def test_by_name(self):
+        names, pages = self.walk()
+        self.assertEqual(names, self.names)
+        self.assertEqual([len(page) for page in pages], [10, 10, 6])
+        self.assertEqual({page.total for page in pages}, {26})
+        self.assertEqual(pages[0].next_cursor, "f09.txt")
+        self.assertEqual(pages[0][3].size, 3)
+
+    def test_by_key(self):
+        names, pages = self.walk(sort_key=operator.attrgetter("hex"), sort_reverse=True)
+        _trees, blobs = self.repo.listdir(self.path)
+        expected = sorted(
+            (blob for blob in blobs if blob.name[0] != "."),
+            key=lambda blob: (blob.hex, blob.name),
+            reverse=True,
+        )
+        self.assertEqual(names, [blob.name for blob in expected])
+        self.assertEqual([len(page) for page in pages], [10, 10, 6])
+
+    def test_by_size(self):
+        by_size = operator.attrgetter("size")
+        names, pages = self.walk(sort_key=by_size)
+        view = self.get_view()
+        view.paginate_by = None
+        view.sort_key = by_size
+        self.assertEqual(names, [entry.name for entry in view.filter_blobs()])
+        self.assertEqual(
+            names[:6],
+            ["f00.txt", "f01.txt", "f02.txt", "f03.txt", "f04.txt", "qux.txt"],
+        )
+        self.assertEqual(names[-1], "f24.txt")
+
+    def test_unknown_cursor(self):
+        view = self.get_view(blobs_after="f04.x")
+        self.assertEqual(view.filter_blobs()[0].name, "f05.txt")
+
+        # Can't tell where it was by hex
+        view = self.get_view(blobs_after="f04.x")
+        view.sort_key = operator.attrgetter("hex")
+        page = view.filter_blobs()
+        self.assertEqual(len(page), 10)
+        self.assertEqual(page[0].hex, min(blob.hex for blob in page))
+
+    def test_trees(self):
+        view = self.get_view(trees_after="d19")
+        trees = view.filter_trees(self.path, paginate=True)
+        self.assertEqual(
+            [tree.name for tree in trees], ["d20", "d21", "d22", "d23", "d24"]
+        )
+        self.assertEqual(trees.total, 25)
+        self.assertIsNone(trees.next_cursor)
+
+        # Root trees are not paginated
+        self.assertNotIsInstance(view.filter_trees(Path("")), models.ListingPage)
+
+    def test_context(self):
+        view = self.get_view()
+        view.git_obj = self.repo.open(self.path)
+        view.load_object()
+        context = view.get_context_data()
+        self.assertEqual((context["trees"].total, len(context["trees"])), (25, 10))
+        self.assertEqual((context["blobs"].total, len(context["blobs"])), (26, 10))
+
+
 class AdminPermissionTestCase(BaseViewTestCase):
     path = ""
 
@@ -339,8 +831,92 @@ class CoverageTestCase(VanillaRepositoryMixin, TestCase):
         trees = view.filter_trees(view.path)
         self.assertNotIn(".directory", [entry["name"] for entry in trees])
 
+    def test_denied_not_loaded(self):
+        request = RequestFactory().get("/")
+        request.user = factories.UserFactory()
+        view = views.DummyBlobView()
+        view.setup(request)
+        self.assertRaises(
+            PermissionDenied, view.dispatch, request, path="foo/bar/baz/qux.txt"
+        )
+        self.assertFalse(view.git_obj.is_loaded)
+
     def test_dispatch_not_found(self):
         request = RequestFactory()
         request.user = factories.UserFactory()
         view = views.DummyTreeView()
         self.assertRaises(Http404, view.dispatch, request, path=Path("tot/coin"))
+
+
+class SearchViewTestCase(VanillaRepositoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        call_command("rebuild_metadata", stdout=StringIO())
+        self.user = factories.UserFactory(password="password")
+        assert self.client.login(username=self.user.username, password="password")
+
+    def test_get(self):
+        models.TreePermission.objects.grant([self.user], [Path("foo/bar/baz")])
+        response = self.client.get(reverse("search"), {"q": "QU"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [entry.path for entry in response.context["results"]],
+            ["foo/bar/baz/qux.txt"],
+        )
+        self.assertEqual(response.context["mode"], "prefix")
+
+        response = self.client.get(reverse("search"), {"q": "foo"})
+        self.assertEqual(response.context["results"], [])
+        response = self.client.get(reverse("search"))
+        self.assertEqual(response.context["results"], [])
+
+    def test_hidden(self):
+        models.TreePermission.objects.grant([self.user], [Path("")], recursive=True)
+        response = self.client.get(reverse("search"), {"q": "den", "mode": "substring"})
+        self.assertEqual(
+            [entry.path for entry in response.context["results"]], ["path/with/hidden"]
+        )
+        # ".directory", ".file" and ".directory/.empty"
+        for query in ("ory", "fil", "mpt"):
+            response = self.client.get(
+                reverse("search"), {"q": query, "mode": "substring"}
+            )
+            self.assertEqual(response.context["results"], [])
+
+    def test_api(self):
+        models.TreePermission.objects.grant([self.user], [Path("")], recursive=True)
+        response = self.client.get(
+            reverse("search_api"), {"q": "X.t", "mode": "substring"}
+        )
+        self.assertEqual(
+            response.json(),
+            {
+                "query": "X.t",
+                "mode": "substring",
+                "results": [
+                    {
+                        "path": "foo/bar/baz/qux.txt",
+                        "type": "blob",
+                        "hex": "100b0dec8c53a40e4de7714b2c612dad5fad9985",
+                        "size": 4,
+                        "mimetype": "text/plain",
+                    }
+                ],
+            },
+        )
+
+    def test_content(self):
+        models.TreePermission.objects.grant([self.user], [Path("")], recursive=True)
+        call_command("index_content", stdout=StringIO())
+        response = self.client.get(reverse("search"), {"q": "Qux", "mode": "content"})
+        self.assertEqual(
+            [entry.path for entry in response.context["results"]],
+            ["foo/bar/baz/qux.txt"],
+        )
+
+    def test_paginate_by(self):
+        models.TreePermission.objects.grant([self.user], [Path("")], recursive=True)
+        request = RequestFactory().get("/", {"q": "f"})
+        request.user = self.user
+        view = views.TestSearchView(request=request, paginate_by=1)
+        self.assertEqual([entry.path for entry in view.get_results()], ["foo"])